@@ -1,11 +1,14 @@
+import argparse
 import getpass
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langgraph.prebuilt import create_react_agent
 import openai 
 from langgraph_supervisor import create_supervisor
 from langchain.chat_models import init_chat_model
 
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk
 from textwrap import dedent
 
 
@@ -43,45 +46,33 @@ class Agent:
     def __repr__(self):
         return f"<Agent name='{self.name}' persona = '{self.persona}' instruction='{self.instruction}'>"
     
-def prepare_input(agent1: Agent, agent2: Agent):
-    user_input = dedent(f"""
-    {agent1.name} persona: {agent1.persona}
-    {agent1.name} instruction: {agent1.instruction}
-    {agent2.name} persona: {agent2.persona}
-    {agent2.name} instruction: {agent2.instruction}
-    """)
-    return user_input
+def prepare_input(*agents: Agent):
+    user_input = "\n".join(
+        f"{agent.name} persona: {agent.persona}\n{agent.name} instruction: {agent.instruction}"
+        for agent in agents
+    )
+    return "\n" + user_input + "\n"
 
 
-def setup_agents():
-    player1_agent = create_react_agent(
-        model="openai:gpt-4.1",
-        tools=[],
-        prompt=(
-            "You are an agent directed by a user.\n\n"
-            "INSTRUCTIONS:\n"
-            "- You will be an instruction and a persona\n"
-            "- You need to follow the instruction given to you by the director, based on the persona\n"
-            "- Your output must be `Name for Player1: dialogue` —no markdown, bullets, or extra prefixes.\n\n"
-        ),
-        name="player1_agent",
-    )
+MODEL = "openai:gpt-4.1"
 
-    player2_agent = create_react_agent(
-        model="openai:gpt-4.1",
+def setup_player_agent(index: int):
+    return create_react_agent(
+        model=MODEL,
         tools=[],
         prompt=(
             "You are an agent directed by a user.\n\n"
             "INSTRUCTIONS:\n"
             "- You will be an instruction and a persona\n"
             "- You need to follow the instruction given to you by the director, based on the persona\n"
-            "- Your output must be `Name for Player2: dialogue` —no markdown, bullets, or extra prefixes.\n\n"
+            f"- Your output must be `Name for Player{index}: dialogue` —no markdown, bullets, or extra prefixes.\n\n"
         ),
-        name="player2_agent",
+        name=f"player{index}_agent",
     )
 
-    gm_agent = create_react_agent(
-        model="openai:gpt-4.1",
+def setup_gm_agent():
+    return create_react_agent(
+        model=MODEL,
         tools=[],
         prompt=(
             "You are the game master.\n\n"
@@ -93,16 +84,22 @@ def setup_agents():
         name="gm_agent",
     )
 
+# Supervisor graph that hands off to each player agent, then the GM, one after another
+def setup_agents(n_players: int = 2):
+    player_agents = [setup_player_agent(i + 1) for i in range(n_players)]
+    player_lines = "".join(
+        f"- an agent for player{i + 1}. Assign the instruction and persona from player{i + 1} in user input to this agent and you will receive the reaction from player{i + 1}\n"
+        for i in range(n_players)
+    )
     supervisor = create_supervisor(
-        model=init_chat_model("openai:gpt-4.1"),
-        agents=[player1_agent, player2_agent, gm_agent],
+        model=init_chat_model(MODEL),
+        agents=[*player_agents, setup_gm_agent()],
         prompt=(
-            "You are a supervisor managing three agents and you will be history dialogue and user input:\n"
-            "- an agent for player1. Assign the instruction and persona from player1 in user input to this agent and you will receive the reaction from player1\n"
-            "- an agent for player2. Assign the instruction and persona from player2 in user input to this agent and you will receive the reaction from player2 \n"
-            "- a game master agent. Assign the history of diaglogue and current reactions from both users to this agen and you will receive the next plot\n"
-            "Assign instructions from both users first to their agents, then assign their outputs along with the scenarios to the game master\n"
-            "You will output the exact results from all three agents one by one."
+            f"You are a supervisor managing {n_players + 1} agents and you will be history dialogue and user input:\n"
+            + player_lines +
+            "- a game master agent. Assign the history of diaglogue and current reactions from all players to this agen and you will receive the next plot\n"
+            "Assign instructions from all players first to their agents, then assign their outputs along with the scenarios to the game master\n"
+            f"You will output the exact results from all {n_players + 1} agents one by one."
             "The output format should be `Speaker: dialogue` —no markdown, bullets, or extra prefixes.\n\n"
         ),
         add_handoff_back_messages=True,
@@ -134,7 +131,68 @@ def run_supervisor(supervisor, players_input, history_dialogue):
     print(supervisor_msg)
     return history_dialogue
 
+# Parallel mode: players are independent given their instructions, so they run concurrently (fan-out),
+# their lines are collected in player order (fan-in), then the GM narrates with its output streamed.
+def run_parallel_round(player_agents, gm_agent, agents: list[Agent], history_dialogue: str, timings: dict):
+    round_start = time.perf_counter()
+
+    def play(index: int):
+        start = time.perf_counter()
+        agent = agents[index]
+        output = player_agents[index].invoke({
+            "messages": [
+                {
+                    "role": "user",
+                    "content": dedent(f"""
+                    "history": {history_dialogue}
+                    {prepare_input(agent)}
+                    """)
+                }
+            ]
+        })
+        return get_supervisor_message(output), time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(agents)) as pool:
+        results = list(pool.map(play, range(len(agents))))
+    timings["players"] = time.perf_counter() - round_start
+    for agent, (line, seconds) in zip(agents, results):
+        timings[f"player:{agent.name}"] = seconds
+        print(line)
+    reactions = "\n".join(line for line, _ in results)
+
+    # GM step, streamed token by token
+    gm_start = time.perf_counter()
+    gm_prompt = dedent(f"""
+    "history": {history_dialogue}
+    "players_reactions": {reactions}
+    """)
+    gm_parts = []
+    for chunk, _metadata in gm_agent.stream({"messages": [{"role": "user", "content": gm_prompt}]},
+                                            stream_mode="messages"):
+        if isinstance(chunk, AIMessageChunk) and chunk.content:
+            if not gm_parts:
+                timings["gm_first_token"] = time.perf_counter() - gm_start
+            gm_parts.append(chunk.content)
+            print(chunk.content, end="", flush=True)
+    print()
+    timings["gm"] = time.perf_counter() - gm_start
+    timings["round"] = time.perf_counter() - round_start
+
+    return history_dialogue + reactions + "\n" + "".join(gm_parts) + "\n"
+
+def print_timings(timings: dict):
+    print("\n--- round latency ---")
+    for stage, seconds in timings.items():
+        print(f"{stage:<28} {seconds * 1000:8.0f} ms")
+
 def main():
+    parser = argparse.ArgumentParser(description="Roleplaying scenario demo")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--mode", choices=("parallel", "supervisor"), default="parallel",
+                        help="parallel: players concurrently, then a streamed GM; supervisor: one handoff at a time")
+    args = parser.parse_args()
+
     # 1. Check API key first
     _set_if_undefined("OPENAI_API_KEY")
 
@@ -142,17 +200,15 @@ def main():
     print("Welcome to the Roleplaying Scenario Setup!")
     print("Please enter the following details:")
     
-    player1_name = input("1) Name for Player 1: ")
-    player1_persona = input("2) Personality for Player 1: ")
-    player2_name = input("3) Name for Player 2: ")
-    player2_persona = input("4) Personality for Player 2: ")\
-    
-    Agent1 = Agent(player1_name, player1_persona)
-    Agent2 = Agent(player2_name, player2_persona)
+    agents = []
+    for i in range(args.players):
+        name = input(f"{2 * i + 1}) Name for Player {i + 1}: ")
+        persona = input(f"{2 * i + 2}) Personality for Player {i + 1}: ")
+        agents.append(Agent(name, persona))
     
     print("\n=== Received Input ===")
-    print(f"Player 1: {Agent1.name} ({Agent1.persona})")
-    print(f"Player 2: {Agent2.name} ({Agent2.persona})")
+    for i, agent in enumerate(agents):
+        print(f"Player {i + 1}: {agent.name} ({agent.persona})")
 
     START = ("""Scenario: In the dimly lit corridor of the Nostromo, your crewmate Kane lies motionless, his chest torn open from the inside, blood still pooling beneath him. The thing that burst from him—a xenomorph—is gone, lurking somewhere on this ship. The crew is panicked, debating what to do: hunt it down, ignore it and continue with original tasks, or abandon ship—drip, drip, drip—Kane's blood is still fresh, and time is running out. 
     """)
@@ -160,7 +216,11 @@ def main():
     print("\n=== Game Start ===")
     print(START)
 
-    supervisor = setup_agents()
+    if args.mode == "supervisor":
+        supervisor = setup_agents(args.players)
+    else:
+        player_agents = [setup_player_agent(i + 1) for i in range(args.players)]
+        gm_agent = setup_gm_agent()
 
     history_dialogue = ("""
     Scenario:
@@ -168,20 +228,22 @@ def main():
     """)
 
     # Start simulation rounds 
-    for i in range(1):
+    for i in range(args.rounds):
         print(f"\n=== Round {i+1} ===")
         
-        player1_instruction = input("5) Player1, please enter instructions to direct your agent: ")
-        player2_instruction = input("6) Player2, please enter instructions to direct your agent: ")
-
-        Agent1.instruct(player1_instruction)
-        Agent2.instruct(player2_instruction)
+        for n, agent in enumerate(agents):
+            agent.instruct(input(f"{2 * args.players + n + 1}) Player{n + 1}, please enter instructions to direct your agent: "))
         print("\n=== Received Instructions ===")
         print("\n=== Waiting for agents to respond ===")
 
-        round_input = prepare_input(Agent1, Agent2)
-
-        history_dialogue = run_supervisor(supervisor, round_input, history_dialogue)
+        if args.mode == "supervisor":
+            start = time.perf_counter()
+            history_dialogue = run_supervisor(supervisor, prepare_input(*agents), history_dialogue)
+            print_timings({"round": time.perf_counter() - start})
+        else:
+            timings = {}
+            history_dialogue = run_parallel_round(player_agents, gm_agent, agents, history_dialogue, timings)
+            print_timings(timings)
 
     print("\n=== Game Over ===")
     print("Thank you for playing!")
@@ -1,15 +1,23 @@
-import io, random, uuid, re
-from flask import Flask, render_template, request, jsonify, send_file
+import random, uuid, re
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 
-from storage import upsert_profile, get_profile, list_profiles
+from storage import upsert_profile, get_profile, list_profiles, profiles_version
 from memory_manager import add_memory, relevant
 from npc_agents import agent_list
-from scenarios import scenarios
-from gm_profiles import gm_list
+from registry import SCENARIO_LISTING, GM_LISTING, get_scenario, get_gm
 from llm_utils import run_script
 from room import Agent, Room
+import http_cache
+import metrics
+import logs
+from http_cache import version_tag, not_modified, tagged, streamed
+from room_serializer import iter_room_state, dumps_with_state
+from transcripts import export as export_transcript, FORMATS as TRANSCRIPT_FORMATS
 from icebreaker_room import IcebreakerRoom, Participant
+from room_index import RoomIndex
+from matchmaker import Matchmaker
+from rate_limit import limited, MESSAGES_PER_USER, MESSAGES_PER_ROOM, LLM_PER_USER, LLM_PER_ROOM
 from user_db import (
     create_or_update_user, get_user, update_user_stats, 
     set_user_ready_status, get_room_ready_status, 
@@ -17,14 +25,34 @@ from user_db import (
 )
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["ETag", "X-Next-Cursor", "Retry-After"])  # Enable CORS for all routes
+http_cache.init_app(app)  # gzip/brotli for large responses
+metrics.init_app(app)  # per-route latency, served on /metrics
+logs.init_app(app)  # request ids on every log record
+log = logs.get_logger("app")
 
-# Initialize the user database
+# Initialize the user database (the only call; importing user_db has no side effects)
 init_user_db()
 
 # Storage for both legacy game sessions and new icebreaker rooms
 game_sessions: dict[str, Room] = {}
 icebreaker_rooms: dict[str, IcebreakerRoom] = {}
+room_index = RoomIndex()  # active icebreaker rooms by creation time, space and activity
+
+# Creates a quick-join room and registers it everywhere rooms are tracked
+def _new_matchmade_room(max_participants: int, context_tags: list[str]) -> IcebreakerRoom:
+    room = IcebreakerRoom(room_title="Quick Join Chat", max_participants=max_participants)
+    room.context_tags = context_tags
+    icebreaker_rooms[room.session_id] = room
+    room_index.add(room)
+    matchmaker.track(room)
+    return room
+
+matchmaker = Matchmaker(_new_matchmade_room, target_size=6)
+
+# JSON response with the room state spliced in from its cached fragments
+def _with_room_state(payload: dict, room: IcebreakerRoom):
+    return Response(dumps_with_state(payload, room), mimetype="application/json")
 
 # index.html
 @app.route("/")
@@ -34,17 +62,18 @@ def index():
 # scenarios list for dropdown
 @app.route("/scenarios")
 def list_scenarios():
-    return jsonify([{k: s[k] for k in ("id", "title")} for s in scenarios])
+    return tagged(SCENARIO_LISTING.body, SCENARIO_LISTING.etag)
 
 # game-masters list
 @app.route("/gms")
 def list_gms():
-    return jsonify([{k: g[k] for k in ("id", "name")} for g in gm_list])
+    return tagged(GM_LISTING.body, GM_LISTING.etag)
 
 # profiles list for dropdown
 @app.get("/profiles")
 def profiles():
-    return jsonify(list_profiles())
+    etag = version_tag("profiles", profiles_version())
+    return not_modified(etag) or tagged(jsonify(list_profiles()), etag)
 
 # start a game
 @app.post("/start_game")
@@ -66,6 +95,7 @@ def start_game():
     if not all([scenario_id, gm_id, user_name, user_persona]):
         return jsonify({"error": "missing scenario, gm, name, or persona"}), 400
 
+    session_id = str(uuid.uuid4())
     if scenario_id == "custom":
         setup = (data.get("custom_setup") or "").strip()
         if not setup:
@@ -77,12 +107,11 @@ def start_game():
             "survival_rule": "Survivors:",
             "twists": [],
         }
-        scenarios.append(scenario)
         scenario_id = scenario["id"]
     else:
-        scenario = next((s for s in scenarios if s["id"] == scenario_id), None)
+        scenario = get_scenario(scenario_id)
 
-    gm = next((g for g in gm_list if g["id"] == gm_id), None)
+    gm = get_gm(gm_id)
     if not scenario or not gm:
         return jsonify({"error": "invalid scenario_id or gm_id"}), 404
 
@@ -94,8 +123,7 @@ def start_game():
     npcs_for_room = [Agent(a["name"], a["persona"]) for a in npcs[:npc_count]]
     all_agents = [user_agent] + npcs_for_room
 
-    room = Room(scenario_id, all_agents, gm)
-    session_id = str(uuid.uuid4())
+    room = Room(scenario_id, all_agents, gm, scenario=scenario, session_id=session_id)
     game_sessions[session_id] = room
 
     return jsonify({
@@ -108,6 +136,7 @@ def start_game():
 
 # submit a turn
 @app.post("/submit_turn")
+@limited((LLM_PER_USER, "user"), (LLM_PER_ROOM, "room"))
 def submit_turn():
     data = request.json
     session_id = data.get("session_id")
@@ -127,20 +156,20 @@ def submit_turn():
 # get room list
 @app.get("/rooms")
 def list_rooms():
-    room_list = []
-    for session_id, room in game_sessions.items():
-        room_info = {
-            "session_id": session_id,
-            "scenario_title": room.scenario["title"],
-            "gm_name": room.gm["name"],
-            "phase": room.phase,
-            "agents": [{"name": a.name, "persona": a.persona} for a in room.agents],
-            "game_over": room.game_over,
-        }
-        if room.game_over:
-            room_info["outcome"] = room.outcome
-        room_list.append(room_info)
-    return jsonify(room_list)
+    etag = version_tag("rooms", len(game_sessions), sum(r.version for r in game_sessions.values()))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return tagged(jsonify([room.info() for room in game_sessions.values()]), etag)
+
+# one game session, for pages that only need their own
+@app.get("/session/<session_id>")
+def get_session(session_id):
+    room = game_sessions.get(session_id)
+    if not room:
+        return jsonify({"error": "invalid session id"}), 404
+    etag = version_tag("session", session_id, room.version)
+    return not_modified(etag) or tagged(jsonify(room.info()), etag)
 
 # join room
 @app.post("/join_room")
@@ -159,17 +188,24 @@ def join_room():
 
     user_agent = Agent(user_name, user_persona)
     room.agents.append(user_agent)
+    room.version += 1
 
     return jsonify({"ok": True})
 
-# full story
+# A story already generated for the room's current version costs no LLM call.
+def _story_cached(data: dict) -> bool:
+    room = game_sessions.get(data.get("session_id"))
+    return bool(room and room.story_cached())
+
+# full story (asgi_app.py serves an async version of this route)
 @app.post("/make_story")
+@limited((LLM_PER_USER, "user"), (LLM_PER_ROOM, "room"), free_if=_story_cached)
 def make_story():
     room = game_sessions.get(request.json.get("session_id"))
     if not room:
         return jsonify({"error":"invalid session id"}), 404
-    story = room.full_story()
-    return jsonify({"story": story})
+    # generated once per dialogue version, so a finished game's story is a cache hit
+    return jsonify({"story": room.story()})
 
 # profile create/update
 @app.post("/profile")
@@ -204,52 +240,41 @@ def add_mem():
     add_memory(data["name"], data["text"])
     return jsonify({"ok": True})
 
-# markdown download
+# transcript download (md, jsonl or txt), streamed for both room types
 @app.post("/download")
 def download():
-    room = game_sessions.get(request.json.get("session_id"))
+    data = request.json
+    session_id = data.get("session_id")
+    fmt = data.get("format", request.args.get("format", "md"))
+    room = game_sessions.get(session_id) or icebreaker_rooms.get(session_id)
     if not room:
         return jsonify({"error":"invalid session id"}), 404
+    if fmt not in TRANSCRIPT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(TRANSCRIPT_FORMATS)}"}), 400
 
-    md = (
-        f"# {room.scenario['title']}\n\n"
-        f"## GM: {room.gm['name']} ({room.gm['difficulty']})\n\n"
-        f"## Setup\n{room.scenario['setup']}\n\n"
-        "## Dialogue\n" + "\n\n".join(room.dialogue_history)
-    )
-    if room.game_over and room.outcome:
-        lbl = {
-            "lifeboat":"Survivors","bank_heist":"Released",
-            "mars_outpost":"Oxygen Recipients","submarine_leak":"Dive Team",
-            "expedition_blizzard":"Sheltered","time_paradox":"Stabilized",
-        }.get(room.scenario["id"],"Outcome")
-        md += f"\n\n## {lbl}\n{', '.join(room.outcome)}"
-
-    buf = io.BytesIO(md.encode())
-    buf.seek(0)
-    return send_file(
-        buf,
-        as_attachment=True,
-        download_name=f"{room.scenario['id']}_simulation.md",
-        mimetype="text/markdown",
-    )
+    chunks, mimetype, ext = export_transcript(room, fmt)
+    name = f"{room.scenario['id']}_simulation" if isinstance(room, Room) else f"icebreaker_{session_id[:8]}"
+    resp = streamed(chunks, mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{name}.{ext}"'
+    return resp
 
-# writing assistant
-@app.post("/writing_assistant")
-def writing_assistant():
-    data = request.json
+ASSISTANT_OPTIONS = dict(temperature=0.7, max_tokens=150, coalesce=True)
+ASSISTANT_FALLBACK = "I'm having trouble right now. Your message looks good - just be yourself!"
+
+# Validates a writing-assistant request; returns (error response, None) or (None, (system_prompt, user_prompt)).
+def _assistant_prompts(data: dict):
     session_id = data.get("session_id")
     display_name = data.get("display_name")
     draft_message = data.get("draft_message")
     assistance_type = data.get("assistance_type", "general")  # general, translation, tone
     
     if not all([session_id, display_name, draft_message]):
-        return jsonify({"error": "missing session_id, display_name, or draft_message"}), 400
+        return ({"error": "missing session_id, display_name, or draft_message"}, 400), None
 
     # Check both legacy rooms and icebreaker rooms
     room = game_sessions.get(session_id) or icebreaker_rooms.get(session_id)
     if not room:
-        return jsonify({"error": "invalid session id"}), 404
+        return ({"error": "invalid session id"}, 404), None
     
     # Different prompts based on assistance type
     if assistance_type == "translation":
@@ -284,20 +309,31 @@ Be concise and natural in your advice. Don't be overly formal or instructional."
 Your draft: "{draft_message}"
 
 Quick suggestion:"""
+
+    return None, (system_prompt, user_prompt)
+
+# Clean up any bold formatting and excessive formality
+def _clean_assistant_reply(text: str) -> str:
+    cleaned_response = re.sub(r'\*\*(.*?)\*\*', r'\1', text.strip())
+    return re.sub(r'\*(.*?)\*', r'\1', cleaned_response)
+
+# writing assistant (asgi_app.py serves an async version of this route)
+@app.post("/writing_assistant")
+@limited((LLM_PER_USER, "user"), (LLM_PER_ROOM, "room"))
+def writing_assistant():
+    data = request.json
+    error, prompts = _assistant_prompts(data)
+    if error:
+        return jsonify(error[0]), error[1]
     
     try:
-        assistant_response = run_script(system_prompt, user_prompt, temperature=0.7, max_tokens=150)
-        
-        # Clean up any bold formatting and excessive formality
-        cleaned_response = re.sub(r'\*\*(.*?)\*\*', r'\1', assistant_response.strip())
-        cleaned_response = re.sub(r'\*(.*?)\*', r'\1', cleaned_response)
-        
+        assistant_response = run_script(*prompts, **ASSISTANT_OPTIONS, room=data["session_id"])
         return jsonify({
-            "response": cleaned_response
+            "response": _clean_assistant_reply(assistant_response)
         })
     except Exception as e:
         return jsonify({
-            "response": "I'm having trouble right now. Your message looks good - just be yourself!"
+            "response": ASSISTANT_FALLBACK
         })
 
 # ===== NEW ICEBREAKER ENDPOINTS =====
@@ -323,8 +359,8 @@ def google_auth():
             return jsonify({"error": "Failed to retrieve user data"}), 500
         
         return jsonify({"user": user})
-    except Exception as e:
-        print(f"Error in google_auth: {e}")
+    except Exception:
+        log.exception("google_auth failed")
         return jsonify({"error": "Internal server error"}), 500
 
 # Get user profile
@@ -369,14 +405,15 @@ def create_icebreaker_room():
     
     # Generate initial icebreaker
     try:
-        initial_icebreaker = room.generate_icebreaker()
-        room.add_icebreaker_message(initial_icebreaker)
-    except Exception as e:
-        print(f"Failed to generate initial icebreaker: {e}")
+        room.next_icebreaker()
+    except Exception:
+        log.exception("failed to generate initial icebreaker", extra={"room_id": room.session_id})
         # Continue without initial icebreaker
     
     # Store the room
     icebreaker_rooms[room.session_id] = room
+    room_index.add(room)
+    matchmaker.track(room)
     
     # Update user stats if authenticated
     try:
@@ -384,18 +421,17 @@ def create_icebreaker_room():
         room_joined = join_user_to_room(google_session_id, room.session_id)
         
         if not stats_updated or not room_joined:
-            print(f"Warning: Failed to update user stats for {google_session_id}")
-    except Exception as e:
-        print(f"Error updating user stats: {e}")
+            log.warning("failed to update user stats", extra={"user_id": google_session_id})
+    except Exception:
+        log.exception("error updating user stats", extra={"user_id": google_session_id})
         # Continue anyway - room creation shouldn't fail due to stats issues
     
-    return jsonify({
+    return _with_room_state({
         "session_id": room.session_id,
         "room_title": room.room_title,
         "participants": [p.to_dict() for p in room.participants],
         "current_icebreaker": room.current_icebreaker,
-        "room_state": room.get_room_state()
-    })
+    }, room)
 
 # Join icebreaker room
 @app.post("/join_icebreaker_room")
@@ -420,11 +456,10 @@ def join_icebreaker_room():
     existing_participant = room.get_participant(google_session_id)
     if existing_participant:
         # User is already in room, just return the current state
-        return jsonify({
+        return _with_room_state({
             "success": True,
             "message": "Already in room",
-            "room_state": room.get_room_state()
-        })
+        }, room)
     
     # Create participant
     participant = Participant(
@@ -444,13 +479,62 @@ def join_icebreaker_room():
     update_user_stats(google_session_id, room_joined=True)
     join_user_to_room(google_session_id, session_id)
     
-    return jsonify({
+    return _with_room_state({"success": True}, room)
+
+# Quick join: place the user in the best open room, or a new one
+# A quick join that seats the user in an existing room makes no LLM call.
+def _quick_join_free(data: dict) -> bool:
+    return bool(matchmaker.room_of(data.get("google_session_id")) or matchmaker.open_rooms())
+
+@app.post("/quick_join")
+@limited((LLM_PER_USER, "user"), free_if=_quick_join_free)  # a new room generates its first icebreaker
+def quick_join():
+    data = request.json
+    google_session_id = data.get("google_session_id")
+    display_name = data.get("display_name")
+    tags = data.get("context_tags") or []
+
+    if not all([google_session_id, display_name]):
+        return jsonify({"error": "missing google_session_id or display_name"}), 400
+    if not isinstance(tags, list):
+        return jsonify({"error": "context_tags must be a list"}), 400
+
+    room = matchmaker.room_of(google_session_id)
+    if room:
+        # User is already in a room, just return the current state
+        return _with_room_state({
+            "success": True,
+            "session_id": room.session_id,
+            "created": False,
+            "message": "Already in room",
+        }, room)
+
+    participant = Participant(
+        google_session_id=google_session_id,
+        display_name=display_name,
+        profile_picture=data.get("profile_picture_url")
+    )
+    room, created = matchmaker.place(participant, [str(t) for t in tags])
+
+    # A new room starts with an icebreaker, like /create_icebreaker_room
+    if created:
+        try:
+            room.next_icebreaker()
+        except Exception:
+            log.exception("failed to generate initial icebreaker", extra={"room_id": room.session_id})
+
+    update_user_stats(google_session_id, room_joined=True)
+    join_user_to_room(google_session_id, room.session_id)
+
+    return _with_room_state({
         "success": True,
-        "room_state": room.get_room_state()
-    })
+        "session_id": room.session_id,
+        "created": created,
+    }, room)
 
 # Send message to icebreaker room
 @app.post("/send_icebreaker_message")
+@limited((MESSAGES_PER_USER, "user"), (MESSAGES_PER_ROOM, "room"))
 def send_icebreaker_message():
     data = request.json
     session_id = data.get("session_id")
@@ -472,18 +556,7 @@ def send_icebreaker_message():
     # Update user stats
     update_user_stats(google_session_id, message_sent=True)
     
-    # Check if we should generate a new icebreaker (timer expired)
-    try:
-        new_icebreaker = room.safe_generate_new_icebreaker()
-        if new_icebreaker:
-            room.add_system_message("🎉 New icebreaker generated! Time for a fresh topic.")
-    except Exception as e:
-        print(f"Failed to auto-generate icebreaker: {e}")
-    
-    return jsonify({
-        "message": message,
-        "room_state": room.get_room_state()
-    })
+    return _with_room_state({"message": message}, room)
 
 # Set ready status
 @app.post("/set_ready_status")
@@ -509,29 +582,36 @@ def set_ready_status():
     
     # If not everyone was ready and a new icebreaker was generated, include room state
     if result.get("new_icebreaker_generated"):
-        result["room_state"] = room.get_room_state()
+        return _with_room_state(result, room)
     
     return jsonify(result)
 
 # Get icebreaker rooms list
+# Query params: limit (default 50, max 200), cursor (from X-Next-Cursor),
+# has_space (true/false), activity_type, q (title prefix). Newest first.
 @app.get("/icebreaker_rooms")
 def list_icebreaker_rooms():
-    rooms_list = []
-    for room in icebreaker_rooms.values():
-        if room.is_active:
-            rooms_list.append({
-                "session_id": room.session_id,
-                "room_title": room.room_title,
-                "participant_count": len(room.participants),
-                "max_participants": room.max_participants,
-                "activity_type": room.activity_type,
-                "created_at": room.created_at.isoformat(),
-                "has_space": len(room.participants) < room.max_participants
-            })
-    
-    # Sort by creation time (newest first)
-    rooms_list.sort(key=lambda x: x["created_at"], reverse=True)
-    return jsonify(rooms_list)
+    args = request.args
+    try:
+        # no limit param: every room, as before paging existed; with one, pages of at most 200
+        limit = min(max(int(args["limit"]), 1), 200) if args.get("limit") else None
+        cursor = int(args["cursor"]) if args.get("cursor") else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    has_space = {"true": True, "false": False}.get(args.get("has_space", "").lower())
+
+    etag = version_tag("icebreaker_rooms", room_index.version, request.query_string.decode())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    rooms_list, next_cursor = room_index.page(
+        limit=limit, cursor=cursor, has_space=has_space,
+        activity_type=args.get("activity_type") or None, title_prefix=args.get("q") or None,
+    )
+    resp = tagged(jsonify(rooms_list), etag)
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = str(next_cursor)
+    return resp
 
 # Get room state
 @app.get("/icebreaker_room/<session_id>")
@@ -539,19 +619,14 @@ def get_icebreaker_room(session_id):
     room = icebreaker_rooms.get(session_id)
     if not room:
         return jsonify({"error": "room not found"}), 404
-    
-    # Check if we should auto-generate a new icebreaker (safe method prevents duplicates)
-    try:
-        new_icebreaker = room.safe_generate_new_icebreaker()
-        if new_icebreaker:
-            room.add_system_message("🎉 New icebreaker generated! Everyone's ready status has been reset.")
-    except Exception as e:
-        print(f"Failed to auto-generate icebreaker: {e}")
-    
-    return jsonify(room.get_room_state())
+
+    # ready-timer and votekick deadlines fire from the scheduler, so reading is side-effect free
+    etag = version_tag(room.state_etag())
+    return not_modified(etag) or streamed(iter_room_state(room), etag)
 
 # Force generate new icebreaker (for testing or manual control)
 @app.post("/generate_icebreaker")
+@limited((LLM_PER_USER, "user"), (LLM_PER_ROOM, "room"))
 def generate_icebreaker():
     data = request.json
     session_id = data.get("session_id")
@@ -568,13 +643,10 @@ def generate_icebreaker():
         return jsonify({"error": "room not found"}), 404
     
     try:
-        new_icebreaker = room.generate_icebreaker()
-        room.add_icebreaker_message(new_icebreaker)
+        # concurrent forced generations for the same room share one LLM call and one post
+        new_icebreaker = room.next_icebreaker()
         
-        return jsonify({
-            "icebreaker": new_icebreaker,
-            "room_state": room.get_room_state()
-        })
+        return _with_room_state({"icebreaker": new_icebreaker}, room)
     except Exception as e:
         return jsonify({"error": f"Failed to generate icebreaker: {str(e)}"}), 500
 
@@ -601,8 +673,8 @@ def start_votekick():
             return jsonify(result), 400
         
         return jsonify(result)
-    except Exception as e:
-        print(f"Error starting votekick: {e}")
+    except Exception:
+        log.exception("error starting votekick")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.post("/vote_on_kick")
@@ -627,8 +699,8 @@ def vote_on_kick():
             return jsonify(result), 400
         
         return jsonify(result)
-    except Exception as e:
-        print(f"Error voting on kick: {e}")
+    except Exception:
+        log.exception("error voting on kick")
         return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == "__main__":
@@ -0,0 +1,326 @@
+# asgi_app.py
+"""
+ASGI entry point: the same API, with LLM waits and push connections on an
+event loop instead of one OS thread each
+
+    uvicorn asgi_app:app --port 5000
+
+* `POST /writing_assistant` and `POST /make_story` are served natively.
+  Validation, prompts and rate limits are the Flask view's own helpers. The
+  LLM call is awaited on the scheduler's Future, so a request waiting on
+  the model holds no thread.
+* `GET /icebreaker_room/<id>/events?version=N` is a long poll. It answers
+  with the room state (and `X-Room-Version`) as soon as the room's version
+  differs from N, or with 304 after `LONG_POLL_SECONDS` (default 25). Open
+  polls cost a Future each, not a thread.
+* Every other route is handed to the Flask app through `WSGIBridge`, a
+  WSGI adapter on a bounded thread pool (`ASGI_WSGI_THREADS`, default 32).
+  Turns and icebreaker generation change room state in long synchronous
+  code paths, so they stay there and still hold a bridge thread while the
+  LLM answers.
+
+With providers that implement `acomplete` (OpenAI, fake), the upstream call
+also runs on the scheduler's event loop, so a waiting LLM call holds no
+thread anywhere. `benchmarks/bench_async_capacity.py` compares this server
+with the threaded Flask dev server.
+"""
+
+import asyncio
+import io
+import json
+import re
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import logs
+from app import (app as flask_app, game_sessions, icebreaker_rooms, ASSISTANT_OPTIONS, ASSISTANT_FALLBACK,
+                 _assistant_prompts, _clean_assistant_reply)
+from config import setting
+from llm_utils import arun_script
+from metrics import HTTP_LATENCY
+from rate_limit import check as check_limits, rejection
+from room_serializer import dumps, iter_room_state
+
+log = logs.get_logger("asgi")
+
+LONG_POLL_SECONDS = float(setting("LONG_POLL_SECONDS", 25))
+EXPOSED_HEADERS = "ETag, X-Next-Cursor, Retry-After, X-Room-Version"
+
+
+class WSGIBridge:
+    """Serves ASGI http requests with a WSGI app, run on a thread pool"""
+    def __init__(self, wsgi_app, threads: int = 32):
+        self.wsgi_app = wsgi_app
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send) -> None:
+        environ = _environ(scope, await _read_body(receive))
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._pool, self.wsgi_app, environ, start_response)
+        try:
+            # the body is pulled one chunk at a time, so streamed responses stay streamed
+            chunks = iter(result)
+            chunk = await loop.run_in_executor(self._pool, next, chunks, None)
+            status, headers = started
+            await send({
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+            })
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self._pool, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self._pool, result.close)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+async def _read_body(receive) -> bytes:
+    parts = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        parts.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(parts)
+
+# WSGI environ for an ASGI http scope.
+def _environ(scope, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": "",
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key == "CONTENT_LENGTH":
+            continue
+        if key != "CONTENT_TYPE":
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class RoomWatch:
+    """Wakes long polls when an icebreaker room changes (room listeners fire on any thread)"""
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Future]] = {}
+        self._watched: set[str] = set()
+        self._loop = None
+
+    async def changed(self, room, since: int, timeout: float) -> bool:
+        """True once room.version differs from *since*, False after *timeout* seconds"""
+        self._loop = self._loop or asyncio.get_running_loop()
+        self._watch(room)
+        if room.version != since:
+            return True
+        waiter = self._loop.create_future()
+        waiters = self._waiters.setdefault(room.session_id, set())
+        waiters.add(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            waiters.discard(waiter)
+            if not waiters:
+                self._waiters.pop(room.session_id, None)
+        return room.version != since
+
+    # Registers the room listener once; it hops onto the event loop to wake waiters.
+    def _watch(self, room) -> None:
+        if room.session_id in self._watched:
+            return
+        self._watched.add(room.session_id)
+        loop = self._loop
+
+        def on_change(changed_room):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._wake, changed_room.session_id)
+        room.add_listener(on_change)
+
+    def _wake(self, session_id: str) -> None:
+        for waiter in self._waiters.get(session_id, ()):
+            if not waiter.done():
+                waiter.set_result(True)
+
+
+class _Request:
+    def __init__(self, scope, body: bytes):
+        self.scope = scope
+        self.body = body
+        self.query = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode("latin-1")).items()}
+        self.remote_addr = (scope.get("client") or ("",))[0]
+
+    def json(self) -> dict:
+        data = json.loads(self.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+
+class BadRequest(Exception):
+    """Malformed request body"""
+
+
+_routes = []  # (method, path regex, route label for metrics, handler)
+
+def route(method: str, template: str):
+    pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", template) + "$")
+    def wrap(fn):
+        _routes.append((method, pattern, template, fn))
+        return fn
+    return wrap
+
+def _match(method: str, path: str):
+    for route_method, pattern, template, fn in _routes:
+        if route_method == method:
+            m = pattern.match(path)
+            if m:
+                return template, fn, m.groupdict()
+    return None
+
+def _json_body(request: _Request) -> dict:
+    try:
+        return request.json()
+    except ValueError:
+        raise BadRequest()
+
+# Applies the rate limits declared on the Flask view of the same name.
+def _limited(view: str, route_label: str, data: dict):
+    fn = flask_app.view_functions[view]
+    if fn.rate_limit_free_if and fn.rate_limit_free_if(data):
+        return None
+    wait = check_limits(fn.rate_limits, route_label, data)
+    if wait:
+        body, headers = rejection(wait)
+        return 429, body, headers
+    return None
+
+
+@route("POST", "/writing_assistant")
+async def writing_assistant(request: _Request):
+    data = _json_body(request)
+    rejected = _limited("writing_assistant", "/writing_assistant", data)
+    if rejected:
+        return rejected
+    error, prompts = _assistant_prompts(data)
+    if error:
+        return error[1], error[0], None
+    try:
+        reply = await arun_script(*prompts, **ASSISTANT_OPTIONS, room=data["session_id"])
+    except Exception:
+        return 200, {"response": ASSISTANT_FALLBACK}, None
+    return 200, {"response": _clean_assistant_reply(reply)}, None
+
+@route("POST", "/make_story")
+async def make_story(request: _Request):
+    data = _json_body(request)
+    rejected = _limited("make_story", "/make_story", data)
+    if rejected:
+        return rejected
+    room = game_sessions.get(data.get("session_id"))
+    if not room:
+        return 404, {"error": "invalid session id"}, None
+    return 200, {"story": await room.astory()}, None
+
+@route("GET", "/icebreaker_room/<session_id>/events")
+async def room_events(request: _Request, session_id: str):
+    room = icebreaker_rooms.get(session_id)
+    if not room:
+        return 404, {"error": "room not found"}, None
+    since = request.query.get("version", "")
+    if since.isdigit():
+        if not await room_watch.changed(room, int(since), LONG_POLL_SECONDS):
+            return 304, b"", {"X-Room-Version": str(room.version)}
+    version = room.version  # read before the state, so a racing change shows up on the next poll
+    return 200, b"".join(iter_room_state(room)), {"X-Room-Version": str(version)}
+
+
+async def _serve_native(scope, receive, send, route_label: str, handler, params: dict) -> None:
+    start = time.perf_counter()
+    headers = dict(scope["headers"])
+    request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex[:16]
+    tokens = logs.bind(request_id=request_id)
+    try:
+        request = _Request(scope, await _read_body(receive))
+        try:
+            status, payload, extra = await handler(request, **params)
+        except BadRequest:
+            status, payload, extra = 400, {"error": "invalid JSON body"}, None
+        except Exception:
+            log.exception("unhandled error in %s", route_label)
+            status, payload, extra = 500, {"error": "Internal server error"}, None
+        body = payload if isinstance(payload, bytes) else dumps(payload)
+        response_headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-expose-headers", EXPOSED_HEADERS.encode()),
+            (b"x-request-id", request_id.encode("latin-1")),
+        ]
+        response_headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (extra or {}).items()]
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+        HTTP_LATENCY.observe(time.perf_counter() - start, method=scope["method"], route=route_label, status=status)
+    finally:
+        logs.unbind(tokens)
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            bridge.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+bridge = WSGIBridge(flask_app, threads=int(setting("ASGI_WSGI_THREADS", 32)))
+room_watch = RoomWatch()
+
+async def app(scope, receive, send):
+    """The ASGI application: native async routes, everything else through the Flask bridge"""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    matched = _match(scope["method"], scope["path"])
+    if matched is None:
+        return await bridge(scope, receive, send)
+    await _serve_native(scope, receive, send, *matched)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=int(setting("PORT", 5000)))
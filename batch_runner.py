@@ -0,0 +1,272 @@
+# batch_runner.py
+"""
+Bulk LLM job runner for offline content (icebreaker banks, scenario
+openings, story regeneration)
+
+Input is JSONL, one job per line:
+
+    {"id": "ice-001", "system": "You are ...", "prompt": "...",
+     "model": "gpt-4o", "temperature": 0.9, "max_tokens": 100}
+
+Only `prompt` is required (`id` defaults to the line number). Each result
+is appended to the output JSONL as soon as it finishes:
+
+    {"id": "ice-001", "output": "...", "latency_ms": 812}
+    {"id": "ice-002", "error": "RateLimitError: ..."}
+
+The output file is also the checkpoint. On restart, ids already present
+are skipped (failed ones too, unless `--retry-errors`), so an interrupted
+run resumes where it stopped. A retried id gets a second row, and the last
+row for an id wins.
+
+Backends:
+
+* `direct` – up to `--concurrency` calls in flight through `gen_oai`, as
+             background work on the LLM scheduler. The CLI has no
+             interactive traffic to protect, so it resizes the process's
+             scheduler to let background work use all `--concurrency`
+             slots (instead of LLM_CONCURRENCY × its background share);
+             LLM_TOKENS_PER_MINUTE still applies
+* `batch`  – groups jobs into batch-API requests (`--batch-size`), submits
+             several batches at once and polls them. `--batch-api openai`
+             uses the OpenAI Batch API; `local` (default) is a stand-in that
+             runs the batch on the configured LLM provider, so the flow can
+             be exercised offline with LLM_PROVIDER=fake.
+
+    python batch_runner.py jobs.jsonl results.jsonl --concurrency 16
+    python batch_runner.py jobs.jsonl results.jsonl --backend batch --batch-size 200
+"""
+
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_scheduler import scheduler
+from llm_utils import gen_oai, get_provider
+
+DEFAULT_MODEL = "gpt-4o"
+
+
+# Ids already in the output file (errors count as done unless retried).
+def load_done(out_path: str, retry_errors: bool = False) -> set:
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash; that job simply runs again
+            if "error" in row and retry_errors:
+                continue
+            done.add(row["id"])
+    return done
+
+# Yields jobs from the input file that have no result yet.
+def iter_jobs(in_path: str, done: set):
+    with open(in_path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            job.setdefault("id", f"line-{n}")
+            if job["id"] not in done:
+                yield job
+
+def to_messages(job: dict) -> list[dict]:
+    messages = [{"role": "system", "content": job["system"]}] if job.get("system") else []
+    return messages + [{"role": "user", "content": job["prompt"]}]
+
+def to_request(job: dict) -> dict:
+    """One batch-API request line for *job*"""
+    return {
+        "custom_id": job["id"],
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": job.get("model", DEFAULT_MODEL),
+            "messages": to_messages(job),
+            "temperature": job.get("temperature", 1.0),
+            "max_tokens": job.get("max_tokens", 1000),
+        },
+    }
+
+
+class ResultWriter:
+    """Appends result rows to the output JSONL, flushing each one"""
+    def __init__(self, path: str):
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.ok = self.failed = 0
+
+    def write(self, row: dict) -> None:
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            if "error" in row:
+                self.failed += 1
+            else:
+                self.ok += 1
+
+    def close(self) -> None:
+        self._f.close()
+
+
+# --- direct backend ---
+
+def _run_one(job: dict) -> dict:
+    start = time.perf_counter()
+    try:
+        text = gen_oai(to_messages(job), model=job.get("model", DEFAULT_MODEL),
+                       temperature=job.get("temperature", 1.0), max_tokens=job.get("max_tokens", 1000),
+                       priority="background", room=job.get("group"))
+    except Exception as e:
+        return {"id": job["id"], "error": f"{type(e).__name__}: {e}"}
+    return {"id": job["id"], "output": text, "latency_ms": round((time.perf_counter() - start) * 1000)}
+
+def run_direct(jobs, writer: ResultWriter, concurrency: int = 8) -> None:
+    # sliding window: never more than *concurrency* jobs read ahead of the results
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        for job in jobs:
+            if len(pending) >= concurrency:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    writer.write(fut.result())
+            pending.add(pool.submit(_run_one, job))
+        for fut in pending:
+            writer.write(fut.result())
+
+
+# --- batch backend ---
+
+class LocalBatchAPI:
+    """Stand-in for a batch endpoint: runs submitted batches on the configured provider"""
+    def __init__(self, workers: int = 8):
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._batches: dict[str, list] = {}
+
+    def submit(self, requests: list[dict]) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        self._batches[batch_id] = [self._pool.submit(self._complete, r) for r in requests]
+        return batch_id
+
+    @staticmethod
+    def _complete(request: dict) -> dict:
+        body = request["body"]
+        try:
+            result = get_provider().complete(body["messages"], model=body["model"],
+                                             temperature=body["temperature"], max_tokens=body["max_tokens"])
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "error": {"message": f"{type(e).__name__}: {e}"}}
+        return {"custom_id": request["custom_id"], "response": {"body": {
+            "choices": [{"message": {"role": "assistant", "content": result.text}}]}}}
+
+    def done(self, batch_id: str) -> bool:
+        return all(f.done() for f in self._batches[batch_id])
+
+    def results(self, batch_id: str) -> list[dict]:
+        return [f.result() for f in self._batches.pop(batch_id)]
+
+
+class OpenAIBatchAPI:
+    """OpenAI Batch API (uploads a JSONL file, polls the batch, downloads the output)"""
+    def __init__(self):
+        from openai import OpenAI
+        from config import setting
+        self._client = OpenAI(api_key=setting("OPENAI_API_KEY"))
+
+    def submit(self, requests: list[dict]) -> str:
+        payload = "".join(json.dumps(r) + "\n" for r in requests).encode()
+        upload = self._client.files.create(file=("batch.jsonl", payload), purpose="batch")
+        batch = self._client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions",
+                                            completion_window="24h")
+        return batch.id
+
+    def done(self, batch_id: str) -> bool:
+        status = self._client.batches.retrieve(batch_id).status
+        return status in ("completed", "failed", "expired", "cancelled")
+
+    def results(self, batch_id: str) -> list[dict]:
+        batch = self._client.batches.retrieve(batch_id)
+        rows = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                rows += [json.loads(l) for l in self._client.files.content(file_id).text.splitlines() if l]
+        return rows
+
+
+# Converts a batch output line into a result row.
+def _from_batch(row: dict) -> dict:
+    if row.get("error"):
+        return {"id": row["custom_id"], "error": row["error"].get("message", str(row["error"]))}
+    try:
+        return {"id": row["custom_id"], "output": row["response"]["body"]["choices"][0]["message"]["content"]}
+    except (KeyError, IndexError, TypeError):
+        return {"id": row["custom_id"], "error": f"malformed response: {row.get('response')}"}
+
+def run_batched(jobs, writer: ResultWriter, api, batch_size: int = 100, max_batches: int = 4,
+                poll_interval: float = 0.5) -> None:
+    in_flight: dict[str, list[str]] = {}   # batch id -> job ids
+    chunks = iter(lambda: list(itertools.islice(jobs, batch_size)), [])
+    exhausted = False
+    while in_flight or not exhausted:
+        while not exhausted and len(in_flight) < max_batches:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+                break
+            in_flight[api.submit([to_request(j) for j in chunk])] = [j["id"] for j in chunk]
+        for batch_id in [b for b in in_flight if api.done(b)]:
+            expected = set(in_flight.pop(batch_id))
+            for row in api.results(batch_id):
+                result = _from_batch(row)
+                expected.discard(result["id"])
+                writer.write(result)
+            for job_id in expected:
+                writer.write({"id": job_id, "error": "missing from batch output"})
+        if in_flight:
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run LLM prompts from JSONL in bulk")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--backend", choices=("direct", "batch"), default="direct")
+    parser.add_argument("--concurrency", type=int, default=8, help="direct: calls in flight; batch: batches in flight")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-api", choices=("local", "openai"), default="local")
+    parser.add_argument("--poll-interval", type=float, default=None, help="seconds between batch status checks")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun jobs whose previous result was an error")
+    args = parser.parse_args()
+
+    done = load_done(args.output, args.retry_errors)
+    jobs = iter_jobs(args.input, done)
+    writer = ResultWriter(args.output)
+    start = time.perf_counter()
+    try:
+        if args.backend == "direct":
+            scheduler.resize(args.concurrency, background_share=1.0)
+            run_direct(jobs, writer, args.concurrency)
+        else:
+            api = OpenAIBatchAPI() if args.batch_api == "openai" else LocalBatchAPI()
+            poll = args.poll_interval or (60.0 if args.batch_api == "openai" else 0.2)
+            run_batched(jobs, writer, api, args.batch_size, args.concurrency, poll)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    total = writer.ok + writer.failed
+    print(f"{total} jobs in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+          f"{writer.ok} ok, {writer.failed} failed, {len(done)} skipped from earlier runs")
+
+
+if __name__ == "__main__":
+    main()
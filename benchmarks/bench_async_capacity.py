@@ -0,0 +1,193 @@
+# benchmarks/bench_async_capacity.py
+"""
+Concurrent-request capacity: threaded Flask dev server vs the ASGI server.
+
+Starts the backend in a subprocess (in a scratch directory, with
+LLM_PROVIDER=fake and a fixed model latency), creates one icebreaker
+room, then fires bursts of N simultaneous POST /writing_assistant
+requests (distinct drafts, so none are coalesced) and waits for all of
+them. Every request spends about --llm-latency-ms waiting on the "model",
+so an ideal server answers the whole burst in about that time.
+
+For each server and burst size the report shows how many requests
+succeeded, p50/p99 latency, wall time for the burst, and the server's
+peak thread count and RSS (sampled from /proc). The dev server starts a
+thread per connection; the ASGI server keeps waiting requests as futures
+on one event loop.
+
+    python benchmarks/bench_async_capacity.py [--clients 100,500,1000] [--llm-latency-ms 2000]
+        [--servers threaded,asgi] [--json out.json]
+
+The LLM scheduler is opened wide (LLM_CONCURRENCY = largest burst, no
+token budget), so the numbers measure the HTTP layer, not upstream limits.
+The asgi server needs uvicorn installed.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+SERVERS = {
+    "threaded": [sys.executable, "-c",
+                 "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", "{port}",
+             "--log-level", "warning", "--backlog", "4096"],
+}
+
+
+def proc_status(pid: int) -> dict:
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Threads", "VmRSS"):
+                    out[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return out
+
+
+def start_server(kind: str, port: int, workdir: str, latency_ms: float, concurrency: int) -> subprocess.Popen:
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([ROOT, workdir]),
+               LLM_PROVIDER="fake", FAKE_LLM_LATENCY_MS=str(latency_ms),
+               LLM_CONCURRENCY=str(concurrency), LLM_TOKENS_PER_MINUTE="0",
+               RATE_LIMITS="off", EMBEDDING_BACKEND="hashing", LOG_LEVEL="WARNING")
+    cmd = [part.format(port=port) for part in SERVERS[kind]]
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/scenarios")
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with code {proc.returncode}")
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def create_room(port: int) -> str:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    body = json.dumps({"google_session_id": "bench-host", "display_name": "Host", "room_title": "bench"})
+    conn.request("POST", "/create_icebreaker_room", body=body, headers={"Content-Type": "application/json"})
+    return json.loads(conn.getresponse().read())["session_id"]
+
+
+# One request on its own connection; returns (status or None, seconds).
+async def one_request(port: int, payload: bytes, timeout: float):
+    start = time.perf_counter()
+    head = (f"POST /writing_assistant HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        try:
+            writer.write(head.encode() + payload)
+            await writer.drain()
+            raw = await asyncio.wait_for(reader.read(), timeout - (time.perf_counter() - start))
+        finally:
+            writer.close()
+        status = int(raw.split(b" ", 2)[1])
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return None, time.perf_counter() - start
+    return status, time.perf_counter() - start
+
+async def burst(port: int, session_id: str, clients: int, timeout: float, tag: str):
+    payloads = [json.dumps({"session_id": session_id, "display_name": "Host",
+                            "draft_message": f"draft {tag}-{i}"}).encode() for i in range(clients)]
+    return await asyncio.gather(*(one_request(port, p, timeout) for p in payloads))
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float("nan")
+
+
+def measure(kind: str, sizes: list[int], args) -> list[dict]:
+    rows = []
+    workdir = tempfile.mkdtemp(prefix=f"capacity_{kind}_")
+    try:
+        for name in os.listdir(ROOT):
+            if name.endswith(".json"):
+                shutil.copy(os.path.join(ROOT, name), workdir)
+        proc = start_server(kind, args.port, workdir, args.llm_latency_ms, max(sizes))
+        try:
+            session_id = create_room(args.port)
+            for clients in sizes:
+                peak = {"Threads": 0, "VmRSS": 0}
+                stop = threading.Event()
+
+                def sample():
+                    while not stop.is_set():
+                        for key, value in proc_status(proc.pid).items():
+                            peak[key] = max(peak[key], value)
+                        stop.wait(0.05)
+
+                sampler = threading.Thread(target=sample, daemon=True)
+                sampler.start()
+                start = time.perf_counter()
+                results = asyncio.run(burst(args.port, session_id, clients, args.timeout, f"{kind}{clients}"))
+                wall = time.perf_counter() - start
+                stop.set()
+                sampler.join()
+                ok = [t for status, t in results if status == 200]
+                rows.append({
+                    "server": kind, "clients": clients, "ok": len(ok), "failed": clients - len(ok),
+                    "p50_ms": round(1000 * percentile(ok, 50), 1), "p99_ms": round(1000 * percentile(ok, 99), 1),
+                    "wall_s": round(wall, 2), "peak_threads": peak["Threads"],
+                    "peak_rss_mb": round(peak["VmRSS"] / 1024, 1),
+                })
+                print(f"{kind:9s} {clients:6d} {len(ok):6d} {clients - len(ok):6d} {rows[-1]['p50_ms']:9.1f} "
+                      f"{rows[-1]['p99_ms']:9.1f} {wall:7.2f} {peak['Threads']:8d} {rows[-1]['peak_rss_mb']:8.1f}",
+                      flush=True)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent-request capacity of the threaded and ASGI servers")
+    parser.add_argument("--clients", default="100,500,1000", help="comma-separated burst sizes")
+    parser.add_argument("--servers", default="threaded,asgi")
+    parser.add_argument("--llm-latency-ms", type=float, default=2000)
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # one client socket per request, and the server inherits the raised limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    sizes = [int(n) for n in args.clients.split(",")]
+    print(f"model latency {args.llm_latency_ms:.0f} ms; ideal burst time ~{args.llm_latency_ms / 1000:.1f} s")
+    print(f"{'server':9s} {'clients':>6s} {'ok':>6s} {'failed':>6s} {'p50ms':>9s} {'p99ms':>9s} "
+          f"{'wall_s':>7s} {'threads':>8s} {'rss_mb':>8s}")
+    rows = []
+    for kind in args.servers.split(","):
+        rows += measure(kind, sizes, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"llm_latency_ms": args.llm_latency_ms, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_embeddings.py
+"""
+Recall and latency of the embedding backends used by memory_manager.
+
+Each cue below is paired with the memory it should retrieve. For every
+backend we embed the memory bank once, then measure recall@k for the cues
+and the per-call latency of embedding one cue (the `relevant()` hot path)
+and the whole bank (the batch path).
+
+    python benchmarks/bench_embeddings.py                 # hashing (+ local if configured)
+    python benchmarks/bench_embeddings.py openai hashing  # needs settings.py / network
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_backends import get_backend
+
+MEMORIES = [
+    "I've lived in Quito, Lima, Boston, NY, SF, and Palo Alto",
+    "I have a black labradane called Florencia. She is 5 years old",
+    "I am a student at Social Computing in Stanford",
+    "I was born in Chicago Illinois",
+    "My favorite harry potter movie was prisoner of Azkaban",
+    "My favorite movie is Shrek",
+    "I appreciate buddhist philosophy",
+    "I play the cello in a chamber ensemble on weekends",
+    "I spent a summer cycling across Patagonia",
+    "Coffee is my main hobby; I roast my own beans",
+    "I speak Spanish, Italian and English",
+    "My grandmother taught me to cook locro de papas",
+]
+
+# (cue, index of the memory that should come back)
+CUES = [
+    ("tell them about your dog", 1),
+    ("where did you grow up and move around", 0),
+    ("what are you studying at university", 2),
+    ("which city were you born in", 3),
+    ("talk about the Azkaban film", 4),
+    ("mention your favorite movie", 5),
+    ("share something about meditation and buddhism", 6),
+    ("what instrument do you play", 7),
+    ("describe your bike trip", 8),
+    ("how do you take your coffee", 9),
+    ("what languages do you speak", 10),
+    ("a dish your grandmother made", 11),
+]
+
+
+def bench(name: str, k: int = 3, repeats: int = 20) -> dict:
+    backend = get_backend(name)
+    bank = np.asarray(backend.embed_documents(MEMORIES), dtype=np.float32)
+    bank /= np.linalg.norm(bank, axis=1, keepdims=True)
+
+    hits = 0
+    query_times = []
+    for cue, target in CUES:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            q = np.asarray(backend.embed_query(cue), dtype=np.float32)
+            query_times.append(time.perf_counter() - t0)
+        top = np.argsort(-(bank @ (q / np.linalg.norm(q))))[:k]
+        hits += target in top
+
+    t0 = time.perf_counter()
+    backend.embed_documents(MEMORIES * 10)
+    batch_time = time.perf_counter() - t0
+
+    return {
+        "backend": f"{backend.name} ({backend.model})",
+        f"recall@{k}": hits / len(CUES),
+        "query_p50_ms": 1000 * float(np.percentile(query_times, 50)),
+        "query_p95_ms": 1000 * float(np.percentile(query_times, 95)),
+        "batch_ms_per_text": 1000 * batch_time / (len(MEMORIES) * 10),
+    }
+
+
+def main():
+    names = sys.argv[1:] or ["hashing", "local"]
+    for name in names:
+        try:
+            r = bench(name)
+        except Exception as e:
+            print(f"{name:8s} skipped: {e}")
+            continue
+        print(f"{r['backend']:32s} recall@3={r['recall@3']:.2f}  "
+              f"query p50={r['query_p50_ms']:.2f}ms p95={r['query_p95_ms']:.2f}ms  "
+              f"batch={r['batch_ms_per_text']:.3f}ms/text")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# benchmarks/bench_room_state.py
+"""
+Cost of encoding one room-state poll: stdlib json over get_room_state()
+(the old jsonify path) vs the cached-fragment serializer.
+
+    python benchmarks/bench_room_state.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from icebreaker_room import IcebreakerRoom, Participant
+from room_serializer import room_state_bytes, orjson
+
+
+def build_room(participants: int, messages: int) -> IcebreakerRoom:
+    room = IcebreakerRoom("Benchmark room")
+    for i in range(participants):
+        room.add_participant(Participant(f"user-{i}", f"User {i}"))
+    for i in range(messages):
+        room.add_message(f"user-{i % participants}", f"message {i}: I'd probably pick flying, honestly")
+    return room
+
+
+def per_call_us(fn, repeats: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return 1e6 * (time.perf_counter() - t0) / repeats
+
+
+def main():
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+    for messages in (50, 500, 2000):
+        room = build_room(8, messages)
+        old = per_call_us(lambda: json.dumps(room.get_room_state()).encode(), 200)
+        new = per_call_us(lambda: room_state_bytes(room), 200)
+        print(f"{messages:5d} messages  jsonify-style={old:8.1f}us  cached={new:8.1f}us  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
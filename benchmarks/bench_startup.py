@@ -0,0 +1,108 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of `import app`, from `python -X importtime`.
+
+Imports the app in fresh interpreters (in a scratch directory with copies of
+the JSON seed files, no settings.py and no API key), then reports the median
+wall time, the app's cumulative import time and the slowest modules pulled
+in. Modules that should stay lazy (langchain, chromadb, openai, ...) are
+flagged if they show up at import.
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--max-ms 600] [--json out.json]
+
+With --max-ms the script exits non-zero when the median exceeds the budget,
+so it can track regressions in CI.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ("langchain", "langchain_community", "langchain_openai", "chromadb", "openai",
+        "sentence_transformers", "tinydb")
+
+
+# Parses -X importtime stderr into {module: (self_us, cumulative_us)}.
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        out[parts[2].strip()] = (self_us, cumulative_us)
+    return out
+
+def run_once(workdir: str) -> tuple[float, dict]:
+    env = dict(os.environ, PYTHONPATH=ROOT, EMBEDDING_BACKEND=os.environ.get("EMBEDDING_BACKEND", "openai"))
+    env.pop("OPENAI_API_KEY", None)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))
+        raise SystemExit(f"import app failed:\n{tail}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure `import app` cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, help="fail if the median wall time exceeds this")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    walls, app_us, modules = [], [], {}
+    for _ in range(args.runs):
+        # fresh directory each run: no databases or caches left over from the previous one
+        workdir = tempfile.mkdtemp(prefix="startup_")
+        try:
+            for name in os.listdir(ROOT):
+                if name.endswith(".json"):
+                    shutil.copy(os.path.join(ROOT, name), workdir)
+            wall, modules = run_once(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        walls.append(wall * 1000)
+        app_us.append(modules.get("app", (0, 0))[1])
+
+    slowest = sorted(modules.items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+    eager = sorted(m for m in modules if m.split(".")[0] in LAZY)
+    report = {
+        "runs": args.runs,
+        "wall_ms_median": round(statistics.median(walls), 1),
+        "wall_ms_min": round(min(walls), 1),
+        "import_app_ms_median": round(statistics.median(app_us) / 1000, 1),
+        "modules_imported": len(modules),
+        "slowest_self_ms": {m: round(s / 1000, 1) for m, (s, _) in slowest},
+        "eager_heavy_imports": sorted({m.split(".")[0] for m in eager}),
+    }
+
+    print(f"import app: median {report['wall_ms_median']} ms wall "
+          f"({report['import_app_ms_median']} ms in imports, {report['modules_imported']} modules)")
+    print(f"{'module':<40} {'self ms':>8}")
+    for m, ms in report["slowest_self_ms"].items():
+        print(f"{m:<40} {ms:>8.1f}")
+    if report["eager_heavy_imports"]:
+        print("imported eagerly (should be lazy):", ", ".join(report["eager_heavy_imports"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_ms and report["wall_ms_median"] > args.max_ms:
+        raise SystemExit(f"startup {report['wall_ms_median']} ms exceeds budget {args.max_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
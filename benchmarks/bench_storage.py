@@ -0,0 +1,84 @@
+# benchmarks/bench_storage.py
+"""
+TinyDB vs the SQLite stores at 100k memories.
+
+Loads N memories spread over A agents into both stores, then times the
+operations the game performs: appending one memory, fetching one agent's
+memories and reading one profile. TinyDB is skipped if it is not installed.
+
+    python benchmarks/bench_storage.py [N] [AGENTS]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_store import MemoryStore, ProfileStore
+
+
+def timed(fn, repeats: int) -> float:
+    """Mean milliseconds per call"""
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        fn(i)
+    return 1000 * (time.perf_counter() - t0) / repeats
+
+
+def bench_sqlite(tmp: str, rows: list[tuple[str, str]], agents: int) -> dict:
+    mem = MemoryStore(os.path.join(tmp, "memories.db"), legacy_json=None)
+    prof = ProfileStore(os.path.join(tmp, "agents.db"), legacy_json=None)
+    t0 = time.perf_counter()
+    with mem._lock:
+        mem._conn.executemany("INSERT INTO memories (agent, text) VALUES (?, ?)", rows)
+        mem._conn.commit()
+    load = time.perf_counter() - t0
+    for a in range(agents):
+        prof.upsert({"name": f"agent{a}", "persona": "x" * 200})
+
+    return {
+        "load_s": load,
+        "insert_ms": timed(lambda i: mem.insert(f"agent{i % agents}", f"new memory {i}"), 200),
+        "by_agent_ms": timed(lambda i: mem.texts(f"agent{i % agents}"), 200),
+        "profile_ms": timed(lambda i: prof.get(f"agent{i % agents}"), 1000),
+    }
+
+
+def bench_tinydb(tmp: str, rows: list[tuple[str, str]], agents: int) -> dict:
+    from tinydb import TinyDB, Query
+    Q = Query()
+    mem = TinyDB(os.path.join(tmp, "memories.json"))
+    prof = TinyDB(os.path.join(tmp, "agents.json"))
+    t0 = time.perf_counter()
+    mem.insert_multiple({"agent": a, "text": t} for a, t in rows)
+    load = time.perf_counter() - t0
+    prof.insert_multiple({"name": f"agent{a}", "persona": "x" * 200} for a in range(agents))
+
+    return {
+        "load_s": load,
+        "insert_ms": timed(lambda i: mem.insert({"agent": f"agent{i % agents}", "text": f"new {i}"}), 5),
+        "by_agent_ms": timed(lambda i: mem.search(Q.agent == f"agent{i % agents}"), 5),
+        "profile_ms": timed(lambda i: prof.search(Q.name == f"agent{i % agents}"), 50),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    agents = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rows = [(f"agent{i % agents}", f"memory number {i} about something that happened") for i in range(n)]
+
+    print(f"{n} memories over {agents} agents")
+    for name, fn in (("sqlite", bench_sqlite), ("tinydb", bench_tinydb)):
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                r = fn(tmp, rows, agents)
+            except ImportError as e:
+                print(f"{name:7s} skipped: {e}")
+                continue
+        print(f"{name:7s} load={r['load_s']:.2f}s  insert={r['insert_ms']:.3f}ms  "
+              f"by_agent={r['by_agent_ms']:.3f}ms  get_profile={r['profile_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
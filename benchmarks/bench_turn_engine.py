@@ -0,0 +1,79 @@
+# benchmarks/bench_turn_engine.py
+"""
+Turn latency of the single-call and parallel turn engines by cast size.
+
+Runs `Room.process_turn` offline (LLM_PROVIDER=fake, hashing embeddings,
+in a scratch directory) for casts of 1..N characters. The fake model has
+a fixed per-call latency plus a per-token cost, so a reply that carries
+every character's line takes longer, as it does upstream. Reported per
+engine and cast size: median turn time (including the summary call both
+engines make) and LLM calls per turn.
+
+    python benchmarks/bench_turn_engine.py [--max-cast 8] [--turns 3] [--latency-ms 300] [--ms-per-token 15]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare turn engines by cast size")
+    parser.add_argument("--max-cast", type=int, default=8, help="largest cast (player + NPCs, capped by npc_agents)")
+    parser.add_argument("--turns", type=int, default=3, help="turns per engine and cast size")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--ms-per-token", type=float, default=15)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    os.environ.update(LLM_PROVIDER="fake", FAKE_LLM_LATENCY_MS=str(args.latency_ms),
+                      FAKE_LLM_MS_PER_TOKEN=str(args.ms_per_token), EMBEDDING_BACKEND="hashing",
+                      LLM_TOKENS_PER_MINUTE="0", LOG_LEVEL="WARNING")
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="turns_")
+    for name in os.listdir(ROOT):
+        if name.endswith(".json"):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+    os.chdir(workdir)
+
+    from llm_utils import get_provider
+    from npc_agents import agent_list
+    from registry import get_gm
+    from room import Agent, Room
+
+    provider = get_provider()
+    gm = get_gm("gm1")
+    npcs = [Agent(a["name"], a["persona"]) for a in agent_list]
+    rows = []
+    print(f"{'engine':9s} {'cast':>4s} {'median_ms':>10s} {'calls/turn':>10s}")
+    try:
+        for engine in ("single", "parallel"):
+            for cast in range(1, min(args.max_cast, len(npcs) + 1) + 1):
+                agents = [Agent("Player", "A curious student.")] + npcs[:cast - 1]
+                times, calls = [], provider.calls
+                for turn in range(args.turns):
+                    room = Room("hp1", agents, gm, session_id=f"{engine}-{cast}-{turn}", turn_engine=engine)
+                    start = time.perf_counter()
+                    room.process_turn("Player", "Look around and say what you see.")
+                    times.append(time.perf_counter() - start)
+                per_turn = (provider.calls - calls) / args.turns
+                rows.append({"engine": engine, "cast": len(agents),
+                             "median_ms": round(1000 * statistics.median(times), 1), "calls_per_turn": per_turn})
+                print(f"{engine:9s} {len(agents):4d} {rows[-1]['median_ms']:10.1f} {per_turn:10.1f}", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "ms_per_token": args.ms_per_token, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# benchmarks/bench_vector_index.py
+"""
+Latency of a top-k lookup in the in-process NumPy index used by
+memory_manager for agents below CHROMA_THRESHOLD.
+
+    python benchmarks/bench_vector_index.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_index import VectorIndex
+
+
+def main(dim: int = 1536, k: int = 3, repeats: int = 2000):
+    rng = np.random.default_rng(0)
+    for n in (10, 100, 500, 2000):
+        index = VectorIndex(dim)
+        index.add([f"memory {i}" for i in range(n)], rng.standard_normal((n, dim), dtype=np.float32))
+        queries = rng.standard_normal((repeats, dim), dtype=np.float32)
+
+        times = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q, k)
+            times.append(time.perf_counter() - t0)
+        print(f"n={n:5d} dim={dim}  p50={1e6 * np.percentile(times, 50):7.1f}us  "
+              f"p99={1e6 * np.percentile(times, 99):7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_wire_bytes.py
+"""
+Bytes on the wire per client-minute for the polling endpoints.
+
+One simulated minute for one client in a busy room: /icebreaker_room/<id>
+every 2s, /icebreaker_rooms every 10s, /scenarios, /gms and /profiles once,
+while the rest of the room posts MESSAGES_PER_MIN messages. "before" sends
+plain GETs; "after" sends If-None-Match with the last ETag and
+Accept-Encoding: gzip, br.
+
+    python benchmarks/bench_wire_bytes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as server
+from icebreaker_room import IcebreakerRoom, Participant
+
+PARTICIPANTS = 8
+HISTORY = 200            # messages already in the room
+MESSAGES_PER_MIN = 10
+OTHER_ROOMS = 30
+
+
+def add_room(room):
+    server.icebreaker_rooms[room.session_id] = room
+    server.room_index.add(room)
+
+
+def make_rooms():
+    server.icebreaker_rooms.clear()
+    server.room_index = server.RoomIndex()
+    for i in range(OTHER_ROOMS):
+        r = IcebreakerRoom(f"Room {i}")
+        r.add_participant(Participant(f"other-{i}", f"Other {i}"))
+        add_room(r)
+    room = IcebreakerRoom("Benchmark room")
+    for i in range(PARTICIPANTS):
+        room.add_participant(Participant(f"user-{i}", f"User {i}"))
+    for i in range(HISTORY):
+        room.add_message(f"user-{i % PARTICIPANTS}", f"message {i}: what a great question, I think about it a lot")
+    add_room(room)
+    return room
+
+
+def wire_size(resp) -> int:
+    head = sum(len(k) + len(v) + 4 for k, v in resp.headers.items())
+    return head + len(resp.get_data())
+
+
+def client_minute(conditional: bool) -> int:
+    room = make_rooms()
+    client = server.app.test_client()
+    etags: dict[str, str] = {}
+    total = 0
+
+    def get(path):
+        nonlocal total
+        headers = {}
+        if conditional:
+            headers["Accept-Encoding"] = "gzip, br"
+            if path in etags:
+                headers["If-None-Match"] = etags[path]
+        resp = client.get(path, headers=headers)
+        if resp.headers.get("ETag"):
+            etags[path] = resp.headers["ETag"]
+        total += wire_size(resp)
+
+    for path in ("/scenarios", "/gms", "/profiles"):
+        get(path)
+    for tick in range(30):  # 2-second polls
+        if tick % (30 // MESSAGES_PER_MIN) == 0:
+            room.add_message("user-1", f"new message at tick {tick}")
+        get(f"/icebreaker_room/{room.session_id}")
+        if tick % 5 == 0:
+            get("/icebreaker_rooms")
+    return total
+
+
+def main():
+    before = client_minute(conditional=False)
+    after = client_minute(conditional=True)
+    print(f"before: {before / 1024:8.1f} KiB per client-minute")
+    print(f"after:  {after / 1024:8.1f} KiB per client-minute  ({100 * after / before:.1f}% of before)")
+
+
+if __name__ == "__main__":
+    main()
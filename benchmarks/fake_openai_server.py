@@ -0,0 +1,96 @@
+# benchmarks/fake_openai_server.py
+"""
+Local stand-in for the OpenAI HTTP API, for load tests.
+
+Answers POST /v1/chat/completions and /v1/embeddings with deterministic
+content (from fake_llm) after a configurable delay. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 (the openai client reads it).
+
+    python benchmarks/fake_openai_server.py --port 8765 --latency-ms 400
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import reply_for  # noqa: E402
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    jitter = 0.0
+    seed = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        digest = hashlib.sha256(json.dumps(req, sort_keys=True).encode()).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big") ^ self.seed)
+        time.sleep(max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)))
+
+        if self.path.endswith("/chat/completions"):
+            text = reply_for(req.get("messages", []), rng)
+            prompt_tokens = sum(len(m.get("content", "")) for m in req.get("messages", [])) // 4
+            self._send({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": req.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                          "total_tokens": prompt_tokens + len(text) // 4},
+            })
+        elif self.path.endswith("/embeddings"):
+            inputs = req.get("input", [])
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            data = []
+            for i, text in enumerate(inputs):
+                r = random.Random(hashlib.sha256(str(text).encode()).digest())
+                data.append({"object": "embedding", "index": i, "embedding": [r.uniform(-1, 1) for _ in range(256)]})
+            self._send({"object": "list", "data": data, "model": req.get("model", "fake"),
+                        "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        else:
+            self._send({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+
+# Starts the server on a daemon thread; returns it (port 0 picks a free port).
+def start(port: int = 0, latency_ms: float = 300, jitter_ms: float = 100, seed: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency_ms / 1000, "jitter": jitter_ms / 1000, "seed": seed,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI API for load tests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    srv = start(args.port, args.latency_ms, args.jitter_ms, args.seed)
+    print(f"fake OpenAI API on http://127.0.0.1:{srv.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
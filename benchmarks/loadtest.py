@@ -0,0 +1,355 @@
+# benchmarks/loadtest.py
+"""
+Load test for app.py with simulated icebreaker clients.
+
+Starts the real Flask app in a subprocess, in a scratch directory with
+throwaway databases. The app's OpenAI calls go to a local fake LLM
+(fake_openai_server.py). Each simulated user:
+
+  * polls /icebreaker_room/<id> every 2s (sending its last ETag),
+  * browses /icebreaker_rooms every 10s,
+  * sends messages, toggles ready and (rarely) starts or joins votekicks
+    at exponentially distributed intervals.
+
+The report has p50/p95/p99 latency per endpoint, throughput and server RSS.
+The same --seed gives the same users, rooms and action schedule.
+
+    python benchmarks/loadtest.py --seed 1 --rooms 50 --users-per-room 8 --duration 60
+"""
+
+import argparse
+import heapq
+import http.client
+import itertools
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+import fake_openai_server
+
+POLL_INTERVAL = 2.0
+BROWSE_INTERVAL = 10.0
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)   # endpoint -> seconds
+        self.errors = defaultdict(int)     # endpoint -> non-2xx/304 responses or exceptions
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latency[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class Client:
+    """Keep-alive HTTP client, one connection per worker thread"""
+
+    def __init__(self, port: int, stats: Stats):
+        self.port = port
+        self.stats = stats
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        return self._local.conn
+
+    def call(self, method: str, path: str, endpoint: str, body: dict | None = None, headers: dict | None = None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        t0 = time.perf_counter()
+        try:
+            conn = self._conn()
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            raw = resp.read()
+            status = resp.status
+            etag = resp.getheader("ETag")
+            if resp.getheader("Connection", "").lower() == "close":
+                conn.close()
+                self._local.conn = None
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            self.stats.record(endpoint, time.perf_counter() - t0, ok=False)
+            return None, None, None
+        self.stats.record(endpoint, time.perf_counter() - t0, ok=status < 400)
+        payload = None
+        if raw and resp.getheader("Content-Type", "").startswith("application/json"):
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                pass
+        return status, payload, etag
+
+
+class SimUser:
+    def __init__(self, index: int, seed: int, room_slot: int):
+        self.rng = random.Random(f"{seed}:{index}")
+        self.user_id = f"load-{seed}-{index}"
+        self.name = f"Load User {index}"
+        self.room_slot = room_slot
+        self.room_id = None
+        self.etag = None
+        self.ready = False
+        self.room_state = None
+
+
+# Creates and fills every room; returns the users that got a seat.
+def setup(client: Client, users: list[SimUser], rooms: int, pool) -> list[SimUser]:
+    room_ids = {}
+
+    def create(slot_users):
+        owner = slot_users[0]
+        client.call("POST", "/auth/google", "/auth/google",
+                    {"google_session_id": owner.user_id, "display_name": owner.name})
+        _, payload, _ = client.call("POST", "/create_icebreaker_room", "/create_icebreaker_room", {
+            "room_title": f"Load room {owner.room_slot}", "display_name": owner.name,
+            "google_session_id": owner.user_id,
+        })
+        if not payload or "session_id" not in payload:
+            return
+        room_ids[owner.room_slot] = payload["session_id"]
+        for u in slot_users:
+            u.room_id = payload["session_id"]
+        for u in slot_users[1:]:
+            client.call("POST", "/auth/google", "/auth/google",
+                        {"google_session_id": u.user_id, "display_name": u.name})
+            client.call("POST", "/join_icebreaker_room", "/join_icebreaker_room", {
+                "session_id": u.room_id, "display_name": u.name, "google_session_id": u.user_id,
+            })
+
+    by_slot = defaultdict(list)
+    for u in users:
+        by_slot[u.room_slot].append(u)
+    list(pool.map(create, [by_slot[s] for s in range(rooms)]))
+    return [u for u in users if u.room_id]
+
+
+# Runs one action for a user and returns the delay until its next run.
+def act(client: Client, user: SimUser, action: str, args) -> float:
+    if action == "poll":
+        headers = {"Accept-Encoding": "gzip"}
+        if user.etag:
+            headers["If-None-Match"] = user.etag
+        status, payload, etag = client.call("GET", f"/icebreaker_room/{user.room_id}",
+                                            "/icebreaker_room/<id>", headers=headers)
+        if status == 200:
+            user.etag = etag
+            user.room_state = payload
+        return POLL_INTERVAL
+
+    if action == "browse":
+        client.call("GET", "/icebreaker_rooms?limit=50", "/icebreaker_rooms",
+                    headers={"Accept-Encoding": "gzip"})
+        return BROWSE_INTERVAL
+
+    if action == "message":
+        client.call("POST", "/send_icebreaker_message", "/send_icebreaker_message", {
+            "session_id": user.room_id, "google_session_id": user.user_id,
+            "message": f"{user.name} says hi #{user.rng.randrange(10_000)}",
+        })
+        return user.rng.expovariate(1 / args.message_interval)
+
+    if action == "ready":
+        user.ready = not user.ready
+        client.call("POST", "/set_ready_status", "/set_ready_status", {
+            "session_id": user.room_id, "google_session_id": user.user_id, "is_ready": user.ready,
+        })
+        return user.rng.expovariate(1 / args.ready_interval)
+
+    if action == "votekick":
+        state = user.room_state or {}
+        open_votes = [v for v in state.get("active_votekicks", []) if v["target_id"] != user.user_id]
+        if open_votes:
+            vote = user.rng.choice(open_votes)
+            client.call("POST", "/vote_on_kick", "/vote_on_kick", {
+                "session_id": user.room_id, "voter_id": user.user_id,
+                "target_id": vote["target_id"], "vote": user.rng.random() < 0.3,
+            })
+        else:
+            others = [p["google_session_id"] for p in state.get("participants", [])
+                      if p["google_session_id"] != user.user_id]
+            if others:
+                client.call("POST", "/start_votekick", "/start_votekick", {
+                    "session_id": user.room_id, "initiator_id": user.user_id,
+                    "target_id": user.rng.choice(others), "reason": "load test",
+                })
+        return user.rng.expovariate(1 / args.votekick_interval)
+
+    raise ValueError(action)
+
+
+# Drives all users until the deadline with a shared event heap and a worker pool.
+def run(client: Client, users: list[SimUser], args) -> float:
+    seq = itertools.count()
+    heap = []
+    start = time.monotonic()
+    for u in users:
+        heap.append((start + u.rng.uniform(0, POLL_INTERVAL), next(seq), u, "poll"))
+        heap.append((start + u.rng.uniform(0, BROWSE_INTERVAL), next(seq), u, "browse"))
+        heap.append((start + u.rng.expovariate(1 / args.message_interval), next(seq), u, "message"))
+        heap.append((start + u.rng.expovariate(1 / args.ready_interval), next(seq), u, "ready"))
+        heap.append((start + u.rng.expovariate(1 / args.votekick_interval), next(seq), u, "votekick"))
+    heapq.heapify(heap)
+
+    lock = threading.Lock()
+    due = queue.Queue(maxsize=args.concurrency * 4)
+    deadline = start + args.duration
+
+    def worker():
+        while True:
+            item = due.get()
+            if item is None:
+                return
+            _, _, u, action = item
+            delay = act(client, u, action, args)
+            with lock:
+                heapq.heappush(heap, (time.monotonic() + delay, next(seq), u, action))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    while time.monotonic() < deadline:
+        with lock:
+            item = heapq.heappop(heap) if heap and heap[0][0] <= time.monotonic() else None
+            wait = (heap[0][0] - time.monotonic()) if heap and item is None else 0
+        if item is None:
+            time.sleep(min(max(wait, 0.001), 0.05))
+            continue
+        due.put(item)
+    for _ in threads:
+        due.put(None)
+    for t in threads:
+        t.join()
+    return time.monotonic() - start
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float("nan")
+
+
+def start_server(port: int, llm_port: int, workdir: str) -> subprocess.Popen:
+    with open(os.path.join(workdir, "settings.py"), "w") as f:
+        f.write('OPENAI_API_KEY = "sk-load-test"\n')
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([ROOT, workdir]),
+               OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+               EMBEDDING_BACKEND="hashing")
+    code = f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/scenarios")
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the icebreaker API")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--users-per-room", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of steady-state load")
+    parser.add_argument("--concurrency", type=int, default=64, help="client worker threads")
+    parser.add_argument("--message-interval", type=float, default=20, help="mean seconds between messages per user")
+    parser.add_argument("--ready-interval", type=float, default=45, help="mean seconds between ready toggles")
+    parser.add_argument("--votekick-interval", type=float, default=600, help="mean seconds between votekick actions")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    users = [SimUser(i, args.seed, i // args.users_per_room) for i in range(args.rooms * args.users_per_room)]
+    llm = fake_openai_server.start(latency_ms=args.llm_latency_ms, seed=args.seed)
+    stats = Stats()
+    client = Client(args.port, stats)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = start_server(args.port, llm.server_address[1], workdir)
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                seated = setup(client, users, args.rooms, pool)
+            stats.latency.clear()
+            stats.errors.clear()
+            rss_start = rss_mb(proc.pid)
+            rss_peak = rss_start
+            sampler_stop = threading.Event()
+
+            def sample():
+                nonlocal rss_peak
+                while not sampler_stop.wait(1.0):
+                    rss_peak = max(rss_peak, rss_mb(proc.pid))
+
+            threading.Thread(target=sample, daemon=True).start()
+            elapsed = run(client, seated, args)
+            sampler_stop.set()
+            rss_end = rss_mb(proc.pid)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+            llm.shutdown()
+
+    total = sum(len(v) for v in stats.latency.values())
+    report = {
+        "seed": args.seed, "rooms": args.rooms, "users": len(seated), "duration_s": round(elapsed, 1),
+        "requests": total, "throughput_rps": round(total / elapsed, 1),
+        "rss_mb": {"start": round(rss_start, 1), "peak": round(rss_peak, 1), "end": round(rss_end, 1)},
+        "endpoints": {
+            ep: {
+                "count": len(v), "errors": stats.errors[ep],
+                "p50_ms": round(1000 * percentile(v, 50), 2),
+                "p95_ms": round(1000 * percentile(v, 95), 2),
+                "p99_ms": round(1000 * percentile(v, 99), 2),
+            }
+            for ep, v in sorted(stats.latency.items())
+        },
+    }
+
+    print(f"seed={args.seed} users={len(seated)} rooms={args.rooms} "
+          f"{total} requests in {elapsed:.1f}s = {report['throughput_rps']} req/s")
+    print(f"server RSS: start {rss_start:.1f} MB, peak {rss_peak:.1f} MB, end {rss_end:.1f} MB")
+    print(f"{'endpoint':28s} {'count':>7s} {'err':>5s} {'p50ms':>8s} {'p95ms':>8s} {'p99ms':>8s}")
+    for ep, r in report["endpoints"].items():
+        print(f"{ep:28s} {r['count']:7d} {r['errors']:5d} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# config.py
+"""
+Optional settings lookup
+
+`settings.py` (git-ignored, holds OPENAI_API_KEY) wins; the environment is
+the fallback, then the given default.
+"""
+import os
+
+
+# Reads a setting from settings.py first, then the environment.
+def setting(name: str, default=None):
+    try:
+        import settings
+        value = getattr(settings, name, None)
+    except ImportError:
+        value = None
+    return value if value is not None else os.environ.get(name, default)
@@ -0,0 +1,123 @@
+# embedding_backends.py
+"""
+Pluggable embedding backends for memory_manager
+
+* `openai`  – OpenAI embeddings endpoint (network, the original behaviour)
+* `hashing` – offline hashed word + character n-gram vectors, built batched
+              with NumPy; no model download, no network
+* `local`   – a sentence-transformers model from `LOCAL_EMBEDDING_MODEL` if
+              the package and the model directory are present, otherwise
+              falls back to `hashing`
+
+Pick one with `EMBEDDING_BACKEND` in settings.py or the environment.
+Every backend exposes `name`, `model`, `embed_documents` and `embed_query`.
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+from config import setting
+
+DEFAULT_BACKEND = "openai"
+
+
+class OpenAIBackend:
+    name = "openai"
+
+    def __init__(self, api_key: str):
+        from langchain_openai import OpenAIEmbeddings
+        self._inner = OpenAIEmbeddings(openai_api_key=api_key)
+        self.model = self._inner.model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._inner.embed_query(text)
+
+
+class HashingBackend:
+    """Feature-hashed bag of words + character n-grams, log-scaled and L2-normalised"""
+    name = "hashing"
+    _WORD = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dim: int = 2048, ngram_range: tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.model = f"hashing-{dim}-{ngram_range[0]}{ngram_range[1]}"
+
+    # Returns the hashed feature ids of one text (words weigh in alongside char n-grams).
+    def _features(self, text: str) -> list[int]:
+        words = self._WORD.findall(text.lower())
+        feats = [f"w:{w}" for w in words]
+        lo, hi = self.ngram_range
+        for w in words:
+            padded = f" {w} "
+            for n in range(lo, hi + 1):
+                feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return [zlib.crc32(f.encode("utf-8")) for f in feats]
+
+    def embed_matrix(self, texts: list[str]) -> np.ndarray:
+        """Embed a batch into a (len(texts), dim) float32 matrix"""
+        rows, cols = [], []
+        for i, text in enumerate(texts):
+            ids = self._features(text)
+            rows.extend([i] * len(ids))
+            cols.extend(ids)
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if cols:
+            h = np.asarray(cols, dtype=np.uint32)
+            # top bit picks the sign so collisions cancel out instead of piling up
+            signs = np.where(h >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(out, (np.asarray(rows), (h % self.dim).astype(np.intp)), signs)
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out.astype(np.float32, copy=False)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_matrix(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+
+class SentenceTransformerBackend:
+    """Small on-disk sentence-transformers model, run on CPU"""
+    name = "local"
+
+    def __init__(self, model_path: str, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self._model = SentenceTransformer(model_path, device="cpu")
+        self.batch_size = batch_size
+        self.model = f"st-{os.path.basename(os.path.normpath(model_path))}"
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vecs = self._model.encode(list(texts), batch_size=self.batch_size,
+                                  normalize_embeddings=True, convert_to_numpy=True)
+        return vecs.astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+# Builds the configured backend (or the one named explicitly).
+def get_backend(name: str | None = None):
+    name = (name or setting("EMBEDDING_BACKEND", DEFAULT_BACKEND)).lower()
+    if name == "openai":
+        return OpenAIBackend(setting("OPENAI_API_KEY"))
+    if name == "hashing":
+        return HashingBackend()
+    if name == "local":
+        model_path = setting("LOCAL_EMBEDDING_MODEL")
+        if model_path and os.path.isdir(model_path):
+            try:
+                return SentenceTransformerBackend(model_path)
+            except ImportError:
+                pass
+        return HashingBackend()
+    raise ValueError(f"Unknown embedding backend: {name}")
@@ -0,0 +1,115 @@
+# embedding_cache.py
+"""
+Persistent embedding cache
+
+* Vectors are keyed by sha256(model + text) and stored as float32 blobs in
+  SQLite (`embeddings.db`), so an identical cue or memory is embedded once.
+* `CachedEmbeddings` wraps any LangChain-style embedder (`embed_documents` /
+  `embed_query`) and can be handed straight to Chroma.
+"""
+
+import hashlib
+import sqlite3
+from threading import Lock
+
+import numpy as np
+
+CACHE_PATH = "embeddings.db"
+
+
+# Returns the cache key for a text embedded by a given model.
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """hash → float32 vector store backed by a single SQLite table"""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Return the cached vectors for whichever *keys* are present"""
+        found = {}
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]) -> None:
+        """Store vectors; existing keys are left untouched"""
+        if not items:
+            return
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def record(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        """Lookup counters since process start plus the number of stored vectors"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": size,
+            }
+
+
+class CachedEmbeddings:
+    """Embedding function that only calls *inner* for texts it has never seen"""
+
+    def __init__(self, inner, cache: EmbeddingCache, model: str):
+        self.inner = inner
+        self.cache = cache
+        self.model = model
+
+    def _embed(self, texts: list[str], query: bool = False) -> list[list[float]]:
+        keys = [text_key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            if query and len(missing) == 1:
+                vecs = [self.inner.embed_query(next(iter(missing.values())))]
+            else:
+                vecs = self.inner.embed_documents(list(missing.values()))
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, vecs)}
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        self.cache.record(hits=len(texts) - len(missing), misses=len(missing))
+        return [found[k].tolist() for k in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(list(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], query=True)[0]
@@ -0,0 +1,174 @@
+# fake_llm.py
+"""
+Deterministic offline LLM provider for tests and benchmarks
+
+`FakeLLMProvider` plugs into llm_utils (set `LLM_PROVIDER = "fake"` or call
+`llm_utils.set_provider`). Replies depend only on the messages, model and
+seed, and are shaped like the real thing:
+
+* game turns     – `GM: ...`, one `Name: ...` line per cast member, then
+                   `GM_DIRECTION: ...` (or just the GM lines / one character's
+                   line for the parallel turn engine's prompts)
+* icebreakers    – a single question
+* summaries      – three short sentences; stories – a few paragraphs
+* anything else  – a short suggestion
+
+Latency is drawn from a fixed, uniform or lognormal distribution, plus
+`ms_per_token` for every completion token, so longer replies take longer
+(as they do upstream). Errors can be injected at a given rate, and a
+requests-per-minute limit raises `FakeRateLimitError` with a retry hint,
+like an upstream 429. `acomplete` is the async form (the latency is an
+`asyncio.sleep`).
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from llm_utils import Completion
+
+
+class FakeLLMError(RuntimeError):
+    """Injected upstream failure"""
+
+
+class FakeRateLimitError(FakeLLMError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limit exceeded, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+QUESTIONS = [
+    "What's a small thing that made you smile this week?",
+    "If you could instantly master one skill, what would it be?",
+    "What's a food from home you wish more people knew about?",
+    "Which place would you show a visitor to your hometown first?",
+    "What's a song you never skip, and why?",
+    "If your week had a movie title, what would it be?",
+]
+NARRATION = [
+    "The torches gutter as a cold draft sweeps the corridor.",
+    "A distant bell tolls, and every head turns toward the stairs.",
+    "Whispers ripple through the room; something has changed.",
+    "The fire cracks loudly, throwing long shadows on the walls.",
+]
+REACTIONS = [
+    "I think we should stick together and see this through.",
+    "Honestly, this feels like a trap, but I'm curious.",
+    "Let's not rush - someone should keep watch.",
+    "I'll go first. Someone has to.",
+    "Does anyone else hear that?",
+]
+
+
+class FakeLLMProvider:
+    name = "fake"
+
+    def __init__(self, seed: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 distribution: str = "fixed", error_rate: float = 0.0,
+                 requests_per_minute: float | None = None, ms_per_token: float = 0.0):
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.ms_per_token = ms_per_token
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._tokens = float(requests_per_minute or 0)
+        self._refilled = time.monotonic()
+
+    # Seeds a generator from the request so identical requests get identical replies.
+    def _rng(self, messages: list[dict], model: str) -> random.Random:
+        digest = hashlib.sha256(json.dumps([messages, model, self.seed], sort_keys=True).encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _delay(self, rng: random.Random) -> float:
+        base, jitter = self.latency_ms / 1000, self.jitter_ms / 1000
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(base - jitter, base + jitter))
+        if self.distribution == "lognormal" and base > 0:
+            # median = latency_ms, jitter_ms acts as the spread
+            sigma = math.log1p(jitter / base) if jitter else 0.5
+            return rng.lognormvariate(math.log(base), sigma)
+        return base
+
+    # Token bucket for the requests-per-minute limit.
+    def _take_token(self) -> None:
+        if not self.requests_per_minute:
+            return
+        with self._lock:
+            now = time.monotonic()
+            rate = self.requests_per_minute / 60
+            self._tokens = min(self.requests_per_minute, self._tokens + (now - self._refilled) * rate)
+            self._refilled = now
+            if self._tokens < 1:
+                raise FakeRateLimitError((1 - self._tokens) / rate)
+            self._tokens -= 1
+
+    def complete(self, messages: list[dict], model: str = "gpt-4o", temperature: float = 1.0,
+                 max_tokens: int = 1000) -> Completion:
+        rng, delay = self._begin(messages, model)
+        result = self._reply(messages, rng)
+        time.sleep(delay + result.completion_tokens * self.ms_per_token / 1000)
+        return result
+
+    # Same reply as complete(), but waits with asyncio.sleep (no thread held during the latency).
+    async def acomplete(self, messages: list[dict], model: str = "gpt-4o", temperature: float = 1.0,
+                        max_tokens: int = 1000) -> Completion:
+        rng, delay = self._begin(messages, model)
+        result = self._reply(messages, rng)
+        await asyncio.sleep(delay + result.completion_tokens * self.ms_per_token / 1000)
+        return result
+
+    # Counts the call, applies the rate limit and draws the latency.
+    def _begin(self, messages: list[dict], model: str) -> tuple[random.Random, float]:
+        with self._lock:
+            self.calls += 1
+        self._take_token()
+        rng = self._rng(messages, model)
+        return rng, self._delay(rng)
+
+    def _reply(self, messages: list[dict], rng: random.Random) -> Completion:
+        if self.error_rate and rng.random() < self.error_rate:
+            raise FakeLLMError("injected upstream error")
+        text = reply_for(messages, rng)
+        # rough 4-characters-per-token estimate, enough for budget and metrics tests
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return Completion(text, prompt_tokens, len(text) // 4)
+
+
+# Builds a reply that matches the kind of prompt.
+def reply_for(messages: list[dict], rng: random.Random) -> str:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    lowered = system.lower()
+
+    if "icebreaker" in lowered:
+        return rng.choice(QUESTIONS)
+    line_for = re.search(r"### Produce (.+)'s line now\.", user)
+    if line_for:
+        return f"{line_for.group(1)}: {rng.choice(REACTIONS)}"
+    if "### Produce the GM narration now." in user:
+        return f"GM: {rng.choice(NARRATION)}\nGM_DIRECTION: Raise the stakes before the next act."
+    if "### Cast" in user:
+        cast = re.findall(r"^- ([^:\n]+):", user.split("### Cast", 1)[1].split("###", 1)[0], re.M)
+        lead = re.search(r"### Director’s order to ([^\n]+)", user)
+        names = [n.strip() for n in cast]
+        if lead and lead.group(1).strip() in names:
+            names.remove(lead.group(1).strip())
+            names.insert(0, lead.group(1).strip())
+        lines = [f"GM: {rng.choice(NARRATION)}"]
+        lines += [f"{name}: {rng.choice(REACTIONS)}" for name in names]
+        return "\n".join(lines + ["GM_DIRECTION: Raise the stakes before the next act."])
+    if "narrator" in lowered or "summarise" in user.lower():
+        return " ".join(rng.sample(NARRATION, 3))
+    if "writer" in lowered or "story" in user.lower():
+        return "\n\n".join(" ".join(rng.sample(NARRATION + REACTIONS, 4)) for _ in range(3))
+    return "Sounds good - keep it short, friendly and ask a question back."
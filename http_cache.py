@@ -0,0 +1,113 @@
+# http_cache.py
+"""
+Conditional GET and response compression helpers for the Flask API
+
+* Read-heavy endpoints tag their payload with a version string. A client
+  that sends the tag back in `If-None-Match` gets an empty `304` and the
+  server skips building the body at all.
+* Responses above `MIN_COMPRESS_SIZE` bytes are compressed with brotli
+  (if the package is installed) or gzip, whichever the client accepts.
+  Streamed responses (`streamed`) are compressed chunk by chunk.
+"""
+
+import gzip
+import uuid
+import zlib
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# version counters restart with the process, so tags carry a per-process prefix
+BOOT_ID = uuid.uuid4().hex[:8]
+
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = {"application/json", "text/markdown", "text/plain", "text/html"}
+
+
+# Builds an ETag value for a resource at a given version.
+def version_tag(*parts) -> str:
+    return "-".join([BOOT_ID, *map(str, parts)])
+
+# Returns a 304 response if the client already holds *etag*, else None.
+def not_modified(etag: str) -> Response | None:
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+# Wraps an already-encoded JSON body (or a jsonify response) with an ETag.
+def tagged(resp: Response | bytes, etag: str) -> Response:
+    if not isinstance(resp, Response):
+        resp = Response(resp, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+# Picks the best encoding the client accepts, or None.
+def _choose_encoding() -> str | None:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+# after_request hook: compresses eligible responses in place.
+def compress_response(resp: Response) -> Response:
+    if (
+        resp.status_code != 200
+        or resp.direct_passthrough
+        or resp.is_streamed
+        or "Content-Encoding" in resp.headers
+        or resp.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return resp
+    encoding = _choose_encoding()
+    if encoding is None:
+        return resp
+
+    if encoding == "br":
+        resp.set_data(brotli.compress(body, quality=4))
+    else:
+        resp.set_data(gzip.compress(body, compresslevel=5))
+    resp.headers["Content-Encoding"] = encoding
+    return resp
+
+# Compresses a stream of byte chunks with the given encoding.
+def _compress_stream(chunks, encoding: str):
+    if encoding == "br":
+        comp = brotli.Compressor(quality=4)
+        step, finish = comp.process, comp.finish
+    else:
+        comp = zlib.compressobj(5, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        step, finish = comp.compress, comp.flush
+    for chunk in chunks:
+        out = step(chunk)
+        if out:
+            yield out
+    yield finish()
+
+# Streams byte chunks (optionally tagged), compressing on the fly if the client accepts it.
+def streamed(chunks, etag: str | None = None, mimetype: str = "application/json") -> Response:
+    encoding = _choose_encoding()
+    if encoding is not None:
+        chunks = _compress_stream(chunks, encoding)
+    resp = Response(chunks, mimetype=mimetype)
+    resp.vary.add("Accept-Encoding")
+    if encoding is not None:
+        resp.headers["Content-Encoding"] = encoding
+    if etag:
+        resp.set_etag(etag)
+    return resp
+
+# Registers compression on a Flask app.
+def init_app(app) -> None:
+    app.after_request(compress_response)
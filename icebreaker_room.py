@@ -1,11 +1,21 @@
 # room.py - Icebreaker Chat Room System
 from __future__ import annotations
+import logging
+import threading
 import time
 import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
 from llm_utils import run_script
+from room_serializer import dumps
+from scheduler import scheduler
+from singleflight import SingleFlight
+from logs import get_logger
+
+log = get_logger("icebreaker_room")
+_message_log = get_logger("icebreaker_room.messages", sample=True)  # per-message path
+_icebreaker_flight = SingleFlight("icebreaker")  # keyed by (room, icebreakers posted so far)
 
 
 # Represents a participant in the icebreaker chat
@@ -19,6 +29,9 @@ class Participant:
         self.message_count = 0
         self.is_ready = False
         self.joined_at = datetime.now()
+        self._joined_at_iso = self.joined_at.isoformat()
+        self._json_key = None
+        self._json = b""
 
     def to_dict(self):
         return {
@@ -27,8 +40,16 @@ class Participant:
             "profile_picture": self.profile_picture,
             "message_count": self.message_count,
             "is_ready": self.is_ready,
-            "joined_at": self.joined_at.isoformat()
+            "joined_at": self._joined_at_iso
         }
+
+    def to_json(self) -> bytes:
+        """Encoded to_dict(), re-encoded only when one of its fields changed"""
+        key = (self.display_name, self.profile_picture, self.message_count, self.is_ready)
+        if key != self._json_key:
+            self._json = dumps(self.to_dict())
+            self._json_key = key
+        return self._json
     
     @property
     def name(self):
@@ -49,33 +70,54 @@ class IcebreakerRoom:
         self.is_active = True
         self.current_icebreaker = None
         self.icebreaker_history: List[str] = []
-        self.chat_history: List[Dict] = []
+        self.chat_history: List[Dict] = []  # append-only; encoded copies live in _chat_json
+        self._chat_json: List[bytes] = []
+        self._chat_json_lock = threading.Lock()
         self.ready_timer_start = None
         self.ready_timer_duration = 60  # seconds
         self.activity_type = "introductions"
         self.context_tags = []  # For LLM context (e.g., "engineering_students", "international_group")
         self._generating_icebreaker = False  # Flag to prevent multiple simultaneous generations
+        self._lock = threading.RLock()  # guards timer callbacks against request threads
         
         # Votekick system
         self.active_votekicks: Dict[str, Dict] = {}  # target_user_id -> votekick_data
         self.votekick_duration = 60  # seconds to complete a vote
         self.votekick_threshold = 0.6  # 60% of participants must vote to kick
+
+        # Bumped on every state change; used as the room's ETag version
+        self.version = 0
+        self._listeners = []  # called with the room after every state change
         
+    def add_listener(self, callback):
+        """Register callback(room) to run after every state change"""
+        self._listeners.append(callback)
+
+    def _touch(self):
+        """Record that the room state changed and notify listeners"""
+        self.version += 1
+        for callback in self._listeners:
+            callback(self)
+
     def add_participant(self, participant: Participant) -> bool:
         """Add a participant to the room if there's space and they're not already in"""
         if len(self.participants) >= self.max_participants:
-            print(f"Room {self.session_id}: Cannot add participant - room is full ({len(self.participants)}/{self.max_participants})")
+            log.info("room full (%d/%d)", len(self.participants), self.max_participants,
+                     extra={"room_id": self.session_id, "user_id": participant.google_session_id})
             return False
         
         # Check if participant already exists by google_session_id
         for p in self.participants:
             if p.google_session_id == participant.google_session_id:
-                print(f"Room {self.session_id}: Participant {participant.google_session_id} already in room")
+                log.debug("participant already in room",
+                          extra={"room_id": self.session_id, "user_id": participant.google_session_id})
                 return False
         
         self.participants.append(participant)
+        self._touch()
         self.add_system_message(f"{participant.display_name} joined the chat")
-        print(f"Room {self.session_id}: Added participant {participant.display_name} ({participant.google_session_id}). Room now has {len(self.participants)} participants.")
+        log.debug("participant joined (%d in room)", len(self.participants),
+                  extra={"room_id": self.session_id, "user_id": participant.google_session_id})
         return True
     
     def remove_participant(self, google_session_id: str) -> bool:
@@ -84,6 +126,7 @@ class IcebreakerRoom:
             if participant.google_session_id == google_session_id:
                 self.add_system_message(f"{participant.display_name} left the chat")
                 self.participants.pop(i)
+                self._touch()
                 
                 # Clean up any active votekicks involving this participant
                 self.cleanup_votekicks_for_participant(google_session_id)
@@ -106,8 +149,12 @@ class IcebreakerRoom:
         }
         
         self.chat_history.append(message)
+        if _message_log.isEnabledFor(logging.DEBUG):
+            _message_log.debug("message (%d chars)", len(content),
+                               extra={"room_id": self.session_id, "user_id": sender_id})
         participant.message_count += 1
         participant.last_active = datetime.now()
+        self._touch()
         
         return message
     
@@ -123,6 +170,7 @@ class IcebreakerRoom:
         }
         
         self.chat_history.append(message)
+        self._touch()
         return message
     
     def add_icebreaker_message(self, icebreaker: str) -> Dict:
@@ -145,7 +193,9 @@ class IcebreakerRoom:
         for participant in self.participants:
             participant.is_ready = False
         self.ready_timer_start = None
+        scheduler.cancel((self.session_id, "ready"))
         self._generating_icebreaker = False  # Reset the flag
+        self._touch()
         
         return message
     
@@ -156,6 +206,7 @@ class IcebreakerRoom:
             return {"error": "Participant not found"}
         
         participant.is_ready = is_ready
+        self._touch()
         ready_count = sum(1 for p in self.participants if p.is_ready)
         total_participants = len(self.participants)
         
@@ -173,11 +224,12 @@ class IcebreakerRoom:
                         "new_icebreaker_generated": True
                     }
             except Exception as e:
-                print(f"Failed to generate icebreaker when everyone ready: {e}")
+                log.exception("failed to generate icebreaker when everyone ready", extra={"room_id": self.session_id})
         
         # Check if 50%+ are ready and start timer (but not if 100% ready)
         elif ready_count >= max(1, total_participants // 2) and not self.ready_timer_start:
             self.ready_timer_start = datetime.now()
+            scheduler.schedule((self.session_id, "ready"), self.ready_timer_duration, self._on_ready_timer)
             self.add_system_message(f"⏰ {ready_count}/{total_participants} participants are ready. New topic in 60 seconds!")
         
         return {
@@ -200,6 +252,26 @@ class IcebreakerRoom:
         
         return int(remaining)
     
+    def _on_ready_timer(self):
+        """Scheduler callback: the ready timer ran out (the LLM call runs without the room lock)"""
+        with self._lock:
+            if not self.should_generate_new_icebreaker():
+                return
+            self._generating_icebreaker = True
+        try:
+            self.next_icebreaker()
+        except Exception:
+            log.exception("failed to generate icebreaker when the ready timer ran out",
+                          extra={"room_id": self.session_id})
+            with self._lock:
+                self._generating_icebreaker = False
+                if self.ready_timer_start:  # still waiting (nobody posted an icebreaker meanwhile): try again
+                    self.ready_timer_start = datetime.now()
+                    scheduler.schedule((self.session_id, "ready"), self.ready_timer_duration, self._on_ready_timer)
+            return
+        with self._lock:
+            self.add_system_message("🎉 New icebreaker generated! Everyone's ready status has been reset.")
+
     def should_generate_new_icebreaker(self) -> bool:
         """Check if it's time to generate a new icebreaker"""
         if not self.ready_timer_start or self._generating_icebreaker:
@@ -270,7 +342,7 @@ Generate ONE engaging icebreaker question. No explanations, just the question.""
 Generate a {self.activity_type} icebreaker question:"""
         
         try:
-            icebreaker = run_script(system_prompt, user_prompt, temperature=0.9, max_tokens=100)
+            icebreaker = run_script(system_prompt, user_prompt, temperature=0.9, max_tokens=100, room=self.session_id)
             # Clean up the response
             icebreaker = icebreaker.strip().strip('"').strip("'")
             
@@ -289,6 +361,18 @@ Generate a {self.activity_type} icebreaker question:"""
             }
             return fallback_questions.get(self.activity_type, "What's the most interesting thing that happened to you this week?")
     
+    def next_icebreaker(self) -> str:
+        """Generate and post the next icebreaker; concurrent callers share one generation"""
+        key = (self.session_id, len(self.icebreaker_history))
+        icebreaker, _ = _icebreaker_flight.do(key, self._generate_and_post)
+        return icebreaker
+
+    def _generate_and_post(self) -> str:
+        icebreaker = self.generate_icebreaker()
+        with self._lock:
+            self.add_icebreaker_message(icebreaker)
+        return icebreaker
+
     def safe_generate_new_icebreaker(self) -> Optional[str]:
         """Safely generate a new icebreaker with proper locking to prevent duplicates"""
         # Check if we should and can generate a new icebreaker
@@ -296,35 +380,31 @@ Generate a {self.activity_type} icebreaker question:"""
             return None
         
         # Set the flag to prevent concurrent generation
-        if self._generating_icebreaker:
-            return None
-        
-        self._generating_icebreaker = True
+        with self._lock:
+            if self._generating_icebreaker:
+                return None
+            self._generating_icebreaker = True
         
         try:
-            new_icebreaker = self.generate_icebreaker()
-            self.add_icebreaker_message(new_icebreaker)
-            return new_icebreaker
+            return self.next_icebreaker()
         except Exception as e:
             # Reset flag on error
             self._generating_icebreaker = False
             raise e
     
-    def get_room_state(self) -> Dict:
-        """Get the current state of the room"""
+    def get_room_state(self, include_lists: bool = True) -> Dict:
+        """Get the current state of the room (without participants and chat_history if include_lists is False)"""
         ready_count = sum(1 for p in self.participants if p.is_ready)
         
-        return {
+        state = {
             "session_id": self.session_id,
             "room_title": self.room_title,
             "facilitator_name": self.facilitator_name,
-            "participants": [p.to_dict() for p in self.participants],
             "participant_count": len(self.participants),
             "max_participants": self.max_participants,
             "is_active": self.is_active,
             "current_icebreaker": self.current_icebreaker,
             "activity_type": self.activity_type,
-            "chat_history": self.chat_history,
             "ready_status": {
                 "ready_count": ready_count,
                 "total_participants": len(self.participants),
@@ -335,6 +415,21 @@ Generate a {self.activity_type} icebreaker question:"""
             "active_votekicks": self.get_active_votekicks(),
             "created_at": self.created_at.isoformat()
         }
+        if include_lists:
+            state["participants"] = [p.to_dict() for p in self.participants]
+            state["chat_history"] = self.chat_history
+        return state
+
+    def chat_json(self) -> List[bytes]:
+        """Encoded chat_history entries, encoding only messages added since the last call"""
+        with self._chat_json_lock:
+            for message in self.chat_history[len(self._chat_json):]:
+                self._chat_json.append(dumps(message))
+        return self._chat_json
+
+    def state_etag(self) -> str:
+        """Version key for get_room_state(); includes the ticking ready timer"""
+        return f"{self.session_id}-{self.version}-{self.get_timer_remaining()}"
 
     def to_dict(self) -> Dict:
         """Convert room to dictionary for API responses"""
@@ -372,6 +467,9 @@ Generate a {self.activity_type} icebreaker question:"""
         }
         
         self.active_votekicks[target_id] = votekick_data
+        scheduler.schedule((self.session_id, "votekick", target_id), self.votekick_duration,
+                           lambda: self._on_votekick_expired(target_id))
+        self._touch()
         
         # Add system message
         reason_text = f" (Reason: {votekick_data['reason']})" if votekick_data['reason'] != "No reason provided" else ""
@@ -397,13 +495,14 @@ Generate a {self.activity_type} icebreaker question:"""
         
         votekick = self.active_votekicks[target_id]
         
-        # Check if vote has expired
+        # Check if vote has expired (the scheduler may not have fired yet)
         if datetime.now() > votekick["expires_at"]:
-            self.cleanup_expired_votekick(target_id)
+            self._on_votekick_expired(target_id)
             return {"error": "Votekick has expired"}
         
         # Record vote
         votekick["votes"][voter_id] = vote
+        self._touch()
         
         # Count votes
         yes_votes = sum(1 for v in votekick["votes"].values() if v)
@@ -417,7 +516,7 @@ Generate a {self.activity_type} icebreaker question:"""
                 self.remove_participant(target_id)
                 self.add_system_message(f"🚫 {target.display_name} has been removed from the room by vote ({yes_votes}/{len(self.participants)+1} voted yes)")
             
-            del self.active_votekicks[target_id]
+            self._end_votekick(target_id)
             return {
                 "success": True,
                 "result": "kicked",
@@ -430,7 +529,7 @@ Generate a {self.activity_type} icebreaker question:"""
         if max_possible_yes < votes_needed:
             target_name = self.get_participant(target_id).display_name if self.get_participant(target_id) else "participant"
             self.add_system_message(f"✅ Vote to remove {target_name} failed - not enough support")
-            del self.active_votekicks[target_id]
+            self._end_votekick(target_id)
             return {
                 "success": True,
                 "result": "failed",
@@ -453,40 +552,46 @@ Generate a {self.activity_type} icebreaker question:"""
         eligible_voters = len(self.participants) - 1
         return max(2, int(eligible_voters * self.votekick_threshold))
     
+    def _end_votekick(self, target_id: str):
+        """Remove a votekick and its pending expiry deadline"""
+        self.active_votekicks.pop(target_id, None)
+        scheduler.cancel((self.session_id, "votekick", target_id))
+        self._touch()
+
+    def _on_votekick_expired(self, target_id: str):
+        """Scheduler callback: a votekick ran out of time"""
+        with self._lock:
+            if target_id not in self.active_votekicks:
+                return
+            target = self.get_participant(target_id)
+            if target:
+                self.add_system_message(f"⏰ Vote to remove {target.display_name} expired without reaching threshold")
+            self._end_votekick(target_id)
+
     def cleanup_expired_votekicks(self):
-        """Clean up expired votekicks"""
+        """Clean up expired votekicks now instead of waiting for the scheduler"""
         now = datetime.now()
-        expired_targets = []
-        
-        for target_id, votekick in self.active_votekicks.items():
-            if now > votekick["expires_at"]:
-                expired_targets.append(target_id)
-                target = self.get_participant(target_id)
-                if target:
-                    self.add_system_message(f"⏰ Vote to remove {target.display_name} expired without reaching threshold")
-        
+        expired_targets = [t for t, v in self.active_votekicks.items() if now > v["expires_at"]]
         for target_id in expired_targets:
-            del self.active_votekicks[target_id]
+            self._on_votekick_expired(target_id)
     
     def cleanup_votekicks_for_participant(self, google_session_id: str):
         """Clean up votekicks when a participant leaves"""
         # Remove any votekicks targeting this participant
         if google_session_id in self.active_votekicks:
-            del self.active_votekicks[google_session_id]
+            self._end_votekick(google_session_id)
         
         # Remove their votes from ongoing votekicks
         for votekick in self.active_votekicks.values():
             if google_session_id in votekick["votes"]:
                 del votekick["votes"][google_session_id]
+        self._touch()
     
     def get_active_votekicks(self) -> List[Dict]:
-        """Get all active votekicks with time remaining"""
-        self.cleanup_expired_votekicks()
+        """Get all active votekicks (expiry is handled by the scheduler, so this has no side effects)"""
         active = []
         
         for target_id, votekick in self.active_votekicks.items():
-            time_remaining = max(0, int((votekick["expires_at"] - datetime.now()).total_seconds()))
-            
             # Separate votes into for/against arrays
             votes_for = [voter_id for voter_id, vote in votekick["votes"].items() if vote]
             votes_against = [voter_id for voter_id, vote in votekick["votes"].items() if not vote]
@@ -0,0 +1,201 @@
+# llm_scheduler.py
+"""
+Central scheduler for all LLM calls
+
+* Two priority classes. `interactive` (GM turns, icebreakers, writing help)
+  is always dispatched before `background` (stories, batch jobs).
+  Background work may hold at most `background_share` of the slots, so a
+  burst of long stories cannot occupy every slot while players wait.
+* Within a class, rooms share the slots by weighted fair queueing. Each job
+  gets a virtual finish tag `max(vtime, room's last tag) + cost / weight`
+  and the smallest tag runs first. A chatty room cannot starve a quiet one.
+* A global concurrency limit and a tokens-per-minute budget (estimated
+  from prompt size + max_tokens, corrected via `settle` once the real usage
+  is known) keep us under the upstream rate limit instead of hitting 429s.
+
+`submit()` returns a `concurrent.futures.Future`. `llm_utils.gen_oai` blocks
+on it; the ASGI routes await it. A job is either a blocking callable, run on
+the worker pool, or (`coroutine=True`) a coroutine function, run on the
+scheduler's own event loop thread, so calls waiting on the upstream API do
+not hold a thread each. Queue depth, in-flight count and queue wait are exported to /metrics.
+Configure with `LLM_CONCURRENCY` and `LLM_TOKENS_PER_MINUTE` (0 = no budget).
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import setting
+from metrics import Gauge, Histogram
+
+PRIORITIES = ("interactive", "background")
+
+QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM calls waiting for a slot", ("priority",))
+IN_FLIGHT = Gauge("llm_in_flight", "LLM calls running", ("priority",))
+QUEUE_WAIT = Histogram("llm_queue_wait_seconds", "Time LLM calls spent queued", ("priority",))
+
+
+class _Job:
+    __slots__ = ("fn", "coroutine", "priority", "cost", "future", "enqueued")
+
+    def __init__(self, fn, priority: str, cost: float, coroutine: bool = False):
+        self.fn = fn
+        self.coroutine = coroutine
+        self.priority = priority
+        self.cost = cost
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    def __init__(self, concurrency: int = 8, tokens_per_minute: float = 0, background_share: float = 0.5):
+        self.concurrency = concurrency
+        self.background_share = background_share
+        self.limits = {"interactive": concurrency, "background": max(1, int(concurrency * background_share))}
+        self.tokens_per_minute = tokens_per_minute
+        self._budget = float(tokens_per_minute)
+        self._refilled = time.monotonic()
+        self._cond = threading.Condition()
+        self._queues = {p: [] for p in PRIORITIES}        # heaps of (finish tag, seq, job)
+        self._vtime = dict.fromkeys(PRIORITIES, 0.0)
+        self._last_tag: dict[tuple, float] = {}           # (priority, room) -> last finish tag
+        self._running = dict.fromkeys(PRIORITIES, 0)
+        self._seq = itertools.count()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self._thread = None
+        self._loop = None
+
+    def submit(self, fn, priority: str = "interactive", room=None, cost: float = 1000, weight: float = 1.0,
+               coroutine: bool = False) -> Future:
+        """Queue *fn* (a blocking LLM call, or a coroutine function with *coroutine*); returns a Future with its result"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        if self.tokens_per_minute:
+            cost = min(cost, self.tokens_per_minute)  # a job larger than the budget would never run
+        job = _Job(fn, priority, cost, coroutine)
+        with self._cond:
+            key = (priority, room)
+            tag = max(self._vtime[priority], self._last_tag.get(key, 0.0)) + cost / weight
+            self._last_tag[key] = tag
+            heapq.heappush(self._queues[priority], (tag, next(self._seq), job))
+            QUEUE_DEPTH.inc(priority=priority)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="llm-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.future
+
+    def resize(self, concurrency: int, background_share: float | None = None) -> None:
+        """Change the slot limits; running jobs keep their slots (e.g. batch_runner sizes it from --concurrency)"""
+        share = self.background_share if background_share is None else background_share
+        with self._cond:
+            self.concurrency, self.background_share = concurrency, share
+            self.limits = {"interactive": concurrency, "background": max(1, int(concurrency * share))}
+            old, self._pool = self._pool, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+            self._cond.notify()
+        old.shutdown(wait=False)
+
+    def settle(self, estimate: float, actual: float) -> None:
+        """Correct the token budget once a call's real usage is known"""
+        if self.tokens_per_minute:
+            with self._cond:
+                self._budget += estimate - actual
+
+    def depth(self) -> dict:
+        with self._cond:
+            return {p: len(q) for p, q in self._queues.items()}
+
+    # Refills the tokens-per-minute budget.
+    def _refill(self, now: float) -> None:
+        rate = self.tokens_per_minute / 60
+        self._budget = min(self.tokens_per_minute, self._budget + (now - self._refilled) * rate)
+        self._refilled = now
+
+    # Picks the next runnable job; returns (job, None) or (None, seconds to wait).
+    def _next(self):
+        if sum(self._running.values()) >= self.concurrency:
+            return None, None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if not queue:
+                continue
+            if self._running[priority] >= self.limits[priority]:
+                continue
+            tag, _, job = queue[0]
+            if self.tokens_per_minute:
+                self._refill(time.monotonic())
+                if self._budget < job.cost:
+                    # higher classes keep their place in line: nothing overtakes a starved head
+                    return None, (job.cost - self._budget) / (self.tokens_per_minute / 60)
+                self._budget -= job.cost
+            heapq.heappop(queue)
+            self._vtime[priority] = tag
+            self._running[priority] += 1
+            if len(self._last_tag) > 2 * sum(len(q) for q in self._queues.values()) + 256:
+                self._prune()
+            return job, None
+        return None, None
+
+    # Forgets rooms whose last tag is behind the class clock (they restart from vtime anyway).
+    def _prune(self) -> None:
+        self._last_tag = {k: t for k, t in self._last_tag.items() if t > self._vtime[k[0]]}
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                job, wait = self._next()
+                while job is None:
+                    self._cond.wait(timeout=wait)
+                    job, wait = self._next()
+            QUEUE_DEPTH.dec(priority=job.priority)
+            QUEUE_WAIT.observe(time.monotonic() - job.enqueued, priority=job.priority)
+            if job.coroutine:
+                asyncio.run_coroutine_threadsafe(self._run_async(job), self._event_loop())
+            else:
+                self._pool.submit(self._run, job)
+
+    # Event loop for coroutine jobs, started on first use.
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="llm-io", daemon=True).start()
+        return self._loop
+
+    def _run(self, job: _Job) -> None:
+        IN_FLIGHT.inc(priority=job.priority)
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn())
+                except BaseException as e:
+                    job.future.set_exception(e)
+        finally:
+            self._release(job)
+
+    async def _run_async(self, job: _Job) -> None:
+        IN_FLIGHT.inc(priority=job.priority)
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(await job.fn())
+                except BaseException as e:
+                    job.future.set_exception(e)
+        finally:
+            self._release(job)
+
+    # Frees the job's slot and wakes the dispatcher.
+    def _release(self, job: _Job) -> None:
+        IN_FLIGHT.dec(priority=job.priority)
+        with self._cond:
+            self._running[job.priority] -= 1
+            self._cond.notify()
+
+
+# Shared scheduler for every LLM call in this process.
+scheduler = LLMScheduler(
+    concurrency=int(setting("LLM_CONCURRENCY", 8)),
+    tokens_per_minute=float(setting("LLM_TOKENS_PER_MINUTE", 150_000)),
+)
@@ -1,27 +1,176 @@
-import os
-from openai import OpenAI
-from settings import OPENAI_API_KEY
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import NamedTuple
 
-_oai = OpenAI(api_key=OPENAI_API_KEY)
+from config import setting
+from metrics import LLM_LATENCY, LLM_TOKENS
+from llm_scheduler import scheduler as llm_scheduler
+from singleflight import SingleFlight
 
 
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class OpenAIProvider:
+    """Chat completions against the OpenAI API (honours OPENAI_BASE_URL)"""
+    name = "openai"
+
+    def __init__(self, api_key: str | None = None):
+        from openai import OpenAI
+        self._api_key = api_key or setting("OPENAI_API_KEY")
+        self._client = OpenAI(api_key=self._api_key)
+        self._async_client = None  # built on the scheduler's event loop, where it is used
+
+    def complete(self, messages, model: str = "gpt-4o", temperature: float = 1.0, max_tokens: int = 1000) -> Completion:
+        response = self._client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+        return self._completion(response)
+
+    async def acomplete(self, messages, model: str = "gpt-4o", temperature: float = 1.0,
+                        max_tokens: int = 1000) -> Completion:
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=self._api_key)
+        response = await self._async_client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+        return self._completion(response)
+
+    @staticmethod
+    def _completion(response) -> Completion:
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+
+_provider = None
+_flight = SingleFlight("llm")
+
+
+# Builds the provider named by LLM_PROVIDER ("openai" or "fake").
+def _make_provider(name: str):
+    if name == "openai":
+        return OpenAIProvider()
+    if name == "fake":
+        from fake_llm import FakeLLMProvider
+        rpm = setting("FAKE_LLM_RPM")
+        return FakeLLMProvider(
+            seed=int(setting("FAKE_LLM_SEED", 0)),
+            latency_ms=float(setting("FAKE_LLM_LATENCY_MS", 0)),
+            jitter_ms=float(setting("FAKE_LLM_JITTER_MS", 0)),
+            distribution=setting("FAKE_LLM_DISTRIBUTION", "fixed"),
+            error_rate=float(setting("FAKE_LLM_ERROR_RATE", 0)),
+            requests_per_minute=float(rpm) if rpm else None,
+            ms_per_token=float(setting("FAKE_LLM_MS_PER_TOKEN", 0)),
+        )
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+# Returns the active provider, building the configured one on first use.
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = _make_provider(setting("LLM_PROVIDER", "openai").lower())
+    return _provider
+
+
+# Swaps the provider (anything with `complete(messages, model, temperature, max_tokens) -> Completion`,
+# optionally with an async `acomplete` of the same shape).
+def set_provider(provider) -> None:
+    global _provider
+    _provider = provider
+
+
+# Times one provider call into LLM_LATENCY.
+@contextmanager
+def _observed(model: str, retry: bool):
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        LLM_LATENCY.observe(time.perf_counter() - start, model=model, status=status, retry="yes" if retry else "no")
+
+# Records token usage and corrects the scheduler's budget estimate.
+def _settle(result: Completion, model: str, estimate: float) -> Completion:
+    LLM_TOKENS.inc(result.prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(result.completion_tokens, model=model, kind="completion")
+    if result.prompt_tokens or result.completion_tokens:
+        llm_scheduler.settle(estimate, result.prompt_tokens + result.completion_tokens)
+    return result
+
+# Runs one completion on the provider (called on a scheduler worker).
+def _complete(provider, messages, model: str, temperature: float, max_tokens: int, retry: bool, estimate: float) -> Completion:
+    with _observed(model, retry):
+        result = provider.complete(messages, model=model, temperature=temperature, max_tokens=max_tokens)
+    return _settle(result, model, estimate)
+
+# Same, for providers with `acomplete` (runs on the scheduler's event loop, no thread held while waiting).
+async def _acomplete(provider, messages, model: str, temperature: float, max_tokens: int, retry: bool,
+                     estimate: float) -> Completion:
+    with _observed(model, retry):
+        result = await provider.acomplete(messages, model=model, temperature=temperature, max_tokens=max_tokens)
+    return _settle(result, model, estimate)
+
+
+# Queues a chat completion on the LLM scheduler; returns a Future of its Completion.
+def submit_chat(messages, model: str = "gpt-4o", temperature: float = 1.0, max_tokens: int = 1000, *,
+                retry: bool = False, priority: str = "interactive", room=None) -> Future:
+    """Chat completion through the shared scheduler; *priority* and *room* decide its place in line."""
+    # rough 4-characters-per-token prompt estimate plus the completion ceiling
+    estimate = sum(len(m["content"]) for m in messages) // 4 + max_tokens
+    provider = get_provider()
+    args = (provider, messages, model, temperature, max_tokens, retry, estimate)
+    if hasattr(provider, "acomplete"):
+        return llm_scheduler.submit(lambda: _acomplete(*args), priority=priority, room=room, cost=estimate,
+                                    coroutine=True)
+    return llm_scheduler.submit(lambda: _complete(*args), priority=priority, room=room, cost=estimate)
+
 # GPT Wrapper
-# calls OpenAI chat completion endpoint - returns string (generated by GPT)
-def gen_oai(messages, model: str = "gpt-4o", temperature: float = 1.0, max_tokens: int = 1000) -> str:
-    """Minimal wrapper around the OpenAI chat completion endpoint."""
-    response = _oai.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        messages=messages,
-        max_tokens=max_tokens,
-    )
-    return response.choices[0].message.content
-
-# High Level Helper 
-def run_script(system_prompt: str, user_prompt: str, *, model: str = "gpt-4o", temperature: float = 1.0, max_tokens: int = 1000) -> str:
-    """Convenience helper: build a two-message chat and return the assistant’s reply."""
+# queues the call on the LLM scheduler and waits - returns string (generated by GPT)
+def gen_oai(messages, model: str = "gpt-4o", temperature: float = 1.0, max_tokens: int = 1000, *,
+            retry: bool = False, priority: str = "interactive", room=None) -> str:
+    return submit_chat(messages, model, temperature, max_tokens, retry=retry, priority=priority, room=room).result().text
+
+# Queues a two-message chat; returns a Future of its Completion.
+def submit_script(system_prompt: str, user_prompt: str, *, model: str = "gpt-4o", temperature: float = 1.0,
+                  max_tokens: int = 1000, retry: bool = False, priority: str = "interactive", room=None,
+                  coalesce: bool = False) -> Future:
+    """With *coalesce*, identical calls already in flight are joined instead of repeated."""
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    return gen_oai(messages, model=model, temperature=temperature, max_tokens=max_tokens)
+    start = lambda: submit_chat(messages, model=model, temperature=temperature, max_tokens=max_tokens,
+                                retry=retry, priority=priority, room=room)
+    if not coalesce:
+        return start()
+    key = hashlib.sha1(json.dumps([messages, model, temperature, max_tokens]).encode()).hexdigest()
+    return _flight.future(key, start)
+
+# High Level Helper
+def run_script(system_prompt: str, user_prompt: str, **kwargs) -> str:
+    """Convenience helper: build a two-message chat and return the assistant’s reply (options as `submit_script`)."""
+    return submit_script(system_prompt, user_prompt, **kwargs).result().text
+
+# Async form of run_script: awaits the scheduled call without blocking a thread.
+async def arun_script(system_prompt: str, user_prompt: str, **kwargs) -> str:
+    return (await asyncio.wrap_future(submit_script(system_prompt, user_prompt, **kwargs))).text
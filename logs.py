@@ -0,0 +1,153 @@
+# logs.py
+"""
+Structured, non-blocking logging
+
+* Call sites log through `get_logger(name)` with stdlib `logging`. A
+  `QueueHandler` only enqueues the record. A single `QueueListener` thread
+  formats it and writes it to stderr, so request threads never block on
+  stdout or interleave partial lines.
+* Records carry the request, room and user ids bound in contextvars
+  (`bind`, or automatically per Flask request via `init_app`), or given
+  explicitly with `extra={"room_id": ...}`.
+* `LOG_FORMAT` chooses `json` (one object per line, default) or `text`.
+  `LOG_LEVEL` sets the threshold (default INFO).
+* Hot paths use `get_logger(name, sample=True)`. Their records below WARNING
+  are kept with probability `LOG_SAMPLE_RATE` (default 0.01). Guard
+  expensive arguments with `log.isEnabledFor(logging.DEBUG)`. At the
+  default level such a call costs a single cached level check.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+
+from config import setting
+
+ROOT = "icebreakers"
+CONTEXT_FIELDS = ("request_id", "room_id", "user_id")
+
+_context = {name: contextvars.ContextVar(name, default=None) for name in CONTEXT_FIELDS}
+# attributes every LogRecord has; anything else came in through `extra`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_listener = None
+_plain = logging.Formatter()
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound correlation ids onto the record (explicit extras win)"""
+    def filter(self, record):
+        for name, var in _context.items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, var.get())
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a *rate* fraction of records below WARNING"""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Resolves the message and traceback in the caller, keeping them apart"""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Installs the queue handler and starts the listener thread (idempotent).
+def configure() -> None:
+    global _listener
+    if _listener is not None:
+        return
+    fmt = setting("LOG_FORMAT", "json").lower()
+    sink = logging.StreamHandler(sys.stderr)
+    sink.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [req=%(request_id)s room=%(room_id)s user=%(user_id)s] %(message)s"))
+
+    q = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    handler.addFilter(ContextFilter())
+    root = logging.getLogger(ROOT)
+    root.setLevel(setting("LOG_LEVEL", "INFO").upper())
+    root.addHandler(handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(q, sink)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+# Returns a logger under the app namespace; `sample=True` uses LOG_SAMPLE_RATE.
+def get_logger(name: str, sample: float | bool | None = None) -> logging.Logger:
+    configure()
+    logger = logging.getLogger(f"{ROOT}.{name}")
+    if sample is True:
+        sample = float(setting("LOG_SAMPLE_RATE", 0.01))
+    if sample and sample < 1 and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(sample))
+    return logger
+
+# Binds correlation ids for the current context; returns tokens for `unbind`.
+def bind(**ids) -> dict:
+    return {name: _context[name].set(value) for name, value in ids.items()}
+
+def unbind(tokens: dict) -> None:
+    for name, token in tokens.items():
+        _context[name].reset(token)
+
+
+def _bind_request():
+    from flask import g, request
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    g._log_tokens = bind(request_id=rid)
+
+def _echo_request_id(resp):
+    rid = _context["request_id"].get()
+    if rid:
+        resp.headers["X-Request-ID"] = rid
+    return resp
+
+def _unbind_request(exc=None):
+    from flask import g
+    tokens = g.pop("_log_tokens", None)
+    if tokens:
+        unbind(tokens)
+
+def init_app(app) -> None:
+    configure()
+    app.before_request(_bind_request)
+    app.after_request(_echo_request_id)
+    app.teardown_request(_unbind_request)
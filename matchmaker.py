@@ -0,0 +1,153 @@
+# matchmaker.py
+"""
+Quick-join matchmaking for icebreaker rooms
+
+Open rooms sit in a heap ordered by fill level (fullest first), then
+activity phase (earliest first, so newcomers join during introductions),
+then age. The heap uses lazy deletion. A room gets a new entry only when
+its priority changes, and stale entries are skipped when popped.
+
+Members are indexed by google_session_id from the same room listener, so
+`place()` returns the room a returning user is already in with one dict
+lookup. Otherwise it looks at the top few open rooms, prefers the one sharing the most
+context tags with the newcomer, and creates a room of `target_size` when
+nothing is open. Filling rooms up to the target size means fewer rooms, and
+fewer LLM icebreaker calls per participant. Rooms that close are dropped
+from the matchmaker.
+"""
+
+import heapq
+import itertools
+from threading import RLock
+
+from icebreaker_room import IcebreakerRoom
+
+PHASES = IcebreakerRoom.ACTIVITY_TYPES
+
+
+class Matchmaker:
+    def __init__(self, create_room, target_size: int = 6, lookahead: int = 8):
+        """*create_room(max_participants, context_tags)* must build, register and return a room"""
+        self.create_room = create_room
+        self.target_size = target_size
+        self.lookahead = lookahead
+        self._lock = RLock()
+        self._heap: list[tuple[tuple, int, str]] = []
+        self._rooms: dict[str, object] = {}
+        self._current: dict[str, tuple[tuple, int]] = {}   # session_id -> live (priority, entry id)
+        self._age = itertools.count()
+        self._entry_ids = itertools.count()
+        self._ages: dict[str, int] = {}
+        self._members: dict[str, set[str]] = {}        # session_id -> google_session_ids in the room
+        self._member_rooms: dict[str, str] = {}        # google_session_id -> session_id
+
+    def track(self, room) -> None:
+        """Make *room* a quick-join candidate and follow its changes"""
+        with self._lock:
+            self._rooms[room.session_id] = room
+            self._ages[room.session_id] = next(self._age)
+            self._update(room)
+        room.add_listener(self._update)
+
+    def open_rooms(self) -> int:
+        with self._lock:
+            return len(self._current)
+
+    def room_of(self, google_session_id: str):
+        """The tracked room *google_session_id* is in, or None"""
+        with self._lock:
+            sid = self._member_rooms.get(google_session_id)
+            return self._rooms[sid] if sid else None
+
+    # Returns the heap priority of a room, or None if it cannot take quick-joiners.
+    def _priority(self, room) -> tuple | None:
+        count = len(room.participants)
+        if not room.is_active or count >= min(room.max_participants, self.target_size):
+            return None
+        phase = PHASES.index(room.activity_type) if room.activity_type in PHASES else len(PHASES)
+        return (-count, phase, self._ages[room.session_id])
+
+    # Room listener: follows membership and pushes a fresh heap entry when the room's priority changed.
+    def _update(self, room) -> None:
+        with self._lock:
+            sid = room.session_id
+            if sid not in self._rooms:
+                return
+            if not room.is_active:
+                self._forget(sid)
+                return
+            # every join or leave is followed by a change with a different head count
+            if len(room.participants) != len(self._members.get(sid, ())):
+                self._set_members(sid, {p.google_session_id for p in room.participants})
+            priority = self._priority(room)
+            live = self._current.get(sid)
+            if live and live[0] == priority:
+                return
+            if priority is None:
+                self._current.pop(sid, None)
+                return
+            entry_id = next(self._entry_ids)
+            self._current[sid] = (priority, entry_id)
+            heapq.heappush(self._heap, (priority, entry_id, sid))
+            if len(self._heap) > 4 * len(self._current) + 64:
+                self._compact()
+
+    # Points each member at *sid*, and drops those who left.
+    def _set_members(self, sid: str, members: set[str]) -> None:
+        known = self._members.get(sid, set())
+        for gid in known - members:
+            if self._member_rooms.get(gid) == sid:
+                del self._member_rooms[gid]
+        for gid in members - known:
+            self._member_rooms[gid] = sid
+        self._members[sid] = members
+
+    # Stops tracking a closed room (its heap entries go stale and are skipped).
+    def _forget(self, sid: str) -> None:
+        self._set_members(sid, set())
+        del self._members[sid]
+        self._rooms.pop(sid, None)
+        self._ages.pop(sid, None)
+        self._current.pop(sid, None)
+
+    # Rebuilds the heap from live entries only.
+    def _compact(self) -> None:
+        self._heap = [(p, e, sid) for sid, (p, e) in self._current.items()]
+        heapq.heapify(self._heap)
+
+    # Pops up to *n* live candidates in priority order (caller pushes them back).
+    def _top(self, n: int) -> list[tuple[tuple, int, str]]:
+        out = []
+        while self._heap and len(out) < n:
+            item = heapq.heappop(self._heap)
+            priority, entry_id, sid = item
+            if self._current.get(sid) == (priority, entry_id):
+                out.append(item)
+        return out
+
+    def place(self, participant, tags: list[str] | None = None):
+        """Add *participant* to the best open room, creating one if needed; returns (room, created)"""
+        wanted = set(tags or [])
+        with self._lock:
+            room = self.room_of(participant.google_session_id)
+            if room:
+                return room, False
+
+            candidates = self._top(self.lookahead)
+            for item in candidates:
+                heapq.heappush(self._heap, item)
+
+            # stable sort keeps heap order among rooms with equal tag overlap
+            ranked = sorted(
+                candidates,
+                key=lambda item: -len(wanted & set(self._rooms[item[2]].context_tags)),
+            )
+            for _, _, sid in ranked:
+                room = self._rooms[sid]
+                if room.add_participant(participant):
+                    return room, False
+
+            room = self.create_room(self.target_size, sorted(wanted))
+            if not room.add_participant(participant):
+                raise RuntimeError("could not place participant in a new room")
+            return room, True
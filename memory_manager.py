@@ -2,53 +2,166 @@
 """
 Simple profile-memory store
 
-* Memories are kept in TinyDB (`memories.json`) for inspection / backup.
-* A per-agent Chroma vector-store is persisted under `.vs_<agent>/`
-  so similarity search survives restarts.
+* Memories are kept in SQLite (`memories.db`, indexed by agent); the
+  legacy TinyDB `memories.json` is imported on first run.
+* Agents with up to `CHROMA_THRESHOLD` memories are searched with an
+  in-process NumPy index (vector_index.py), loaded lazily from the stored
+  memories and kept in sync by `add_memory`.
+* Larger agents use a per-agent Chroma vector-store persisted under
+  `.vs_<agent>/` so similarity search survives restarts.
+* Nothing is opened at import. The store, the embedding backend and
+  langchain/Chroma load on the first `add_memory` / `relevant` call.
+* Embeddings come from the backend chosen by `EMBEDDING_BACKEND`
+  (see embedding_backends.py) and go through a persistent hash-keyed
+  cache (`embeddings.db`), so repeated cues and duplicate memories cost
+  no extra embedding call.
 """
 
-from settings import OPENAI_API_KEY
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from tinydb import TinyDB, Query
+from sqlite_store import MemoryStore
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from embedding_backends import get_backend
+from vector_index import VectorIndex
+from metrics import register_collector
+from config import setting
 from threading import Lock
 import os
+import shutil
+
+# agents with more memories than this are searched through Chroma
+CHROMA_THRESHOLD = int(setting("CHROMA_THRESHOLD", 2000))
 
-# persistent stores
-_db = TinyDB("memories.json")
-Q = Query()
 _lock = Lock()
+_build_locks: dict[str, Lock] = {}  # agent -> lock held while its index is built (outside `_lock`)
+
+# persistent stores and the embedding pipeline, opened on first use by _init()
+_db: MemoryStore | None = None
+_backend = None
+_emb_cache: EmbeddingCache | None = None
+_emb: CachedEmbeddings | None = None
+
+# in-memory indexes for small agents, and the agents that have outgrown them
+_indexes: dict[str, VectorIndex] = {}
+_on_chroma: set[str] = set()
 
-_emb = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# Opens the store and builds the embedding backend on first use (caller holds `_lock`).
+def _init() -> None:
+    global _db, _backend, _emb_cache, _emb
+    if _emb is None:
+        _db = MemoryStore("memories.db")
+        _backend = get_backend()
+        _emb_cache = EmbeddingCache()
+        _emb = CachedEmbeddings(_backend, _emb_cache, model=_backend.model)
 
 # Returns the directory path that holds an agent’s Chroma index.
 def _vs_path(agent: str) -> str:
     """Directory that holds an agent’s Chroma index"""
-    return f".vs_{agent}"
+    # vectors from different backends have different shapes, so they get separate indexes
+    if _backend.name == "openai":
+        return f".vs_{agent}"
+    return f".vs_{agent}.{_backend.name}"
 
 # Loads (or implicitly creates) the agent’s vector store for memory retrieval.
-def _load_vs(agent: str) -> Chroma:
+def _load_vs(agent: str):
     """Load (or implicitly create) the agent’s vector store"""
+    from langchain_community.vectorstores import Chroma
     return Chroma(persist_directory=_vs_path(agent), embedding_function=_emb)
 
+# Replaces an agent's Chroma store with one built from the given memories.
+def _rebuild_vs(agent: str, texts: list[str]) -> None:
+    """Rebuild the agent’s Chroma store from *texts* (embeddings come from the cache)"""
+    from langchain_community.vectorstores import Chroma
+    shutil.rmtree(_vs_path(agent), ignore_errors=True)
+    Chroma.from_texts(texts, _emb, persist_directory=_vs_path(agent))
+
+# Returns the agent's index state if it is already known (caller holds `_lock`).
+def _loaded(agent: str) -> tuple[bool, VectorIndex | None]:
+    if agent in _on_chroma:
+        return True, None
+    return agent in _indexes, _indexes.get(agent)
+
+# Returns the agent's in-memory index, loading it on first use; None once the agent is on Chroma.
+def _index_for(agent: str) -> VectorIndex | None:
+    """Lazily build the agent’s NumPy index, embedding outside `_lock` so other agents are not blocked"""
+    with _lock:
+        _init()
+        known, index = _loaded(agent)
+        if known:
+            return index
+        build_lock = _build_locks.setdefault(agent, Lock())
+
+    with build_lock:
+        with _lock:
+            known, index = _loaded(agent)  # built by another thread while we waited
+            if known:
+                return index
+            texts = _db.texts(agent)
+
+        if len(texts) > CHROMA_THRESHOLD:
+            if not os.path.exists(_vs_path(agent)):
+                _rebuild_vs(agent, texts)
+            index = None
+        else:
+            index = VectorIndex()
+            if texts:
+                index.add(texts, _emb.embed_documents(texts))
+
+        # no rows are added meanwhile: add_memory resolves the index before inserting
+        with _lock:
+            if index is None:
+                _on_chroma.add(agent)
+            else:
+                _indexes[agent] = index
+            _build_locks.pop(agent, None)
+        return index
+
 # Appends a raw memory string to the database and updates the corresponding vector store.
 def add_memory(agent: str, text: str) -> None:
-    """Append a raw memory string and update the vector store"""
+    """Append a raw memory string and update the agent’s index"""
+    _index_for(agent)  # load the agent first, so the row reaches whichever index it uses
+    vector = _emb.embed_query(text)
     with _lock:
-        _db.insert({"agent": agent, "text": text})
-        _load_vs(agent).add_texts([text])
+        _db.insert(agent, text)
+        if agent in _on_chroma:
+            _load_vs(agent).add_texts([text])  # embedding comes from the cache
+            return
+        index = _indexes[agent]
+        index.add([text], [vector])
+        if len(index) > CHROMA_THRESHOLD:
+            _rebuild_vs(agent, index.texts)
+            _on_chroma.add(agent)
+            del _indexes[agent]
 
-# retrieves up to *k* memories that are most similar to a given cue for a specified agent, using a vector store
+# retrieves up to *k* memories that are most similar to a given cue for a specified agent
 def relevant(agent: str, cue: str, k: int = 3) -> list[str]:
     """
     Return up to *k* memories most similar to `cue`.
-    Falls back to the last k raw strings if the agent
-    has no vector index yet.
+    Small agents are searched in-process with one
+    matrix-vector product; large ones go through Chroma.
     """
-    vs_dir = _vs_path(agent)
-    if not os.path.exists(vs_dir):
-        rows = _db.search(Q.agent == agent)[-k:]
-        return [r["text"] for r in rows]
+    index = _index_for(agent)
+    if index is None:
+        docs = _load_vs(agent).similarity_search(cue, k)
+        return [d.page_content for d in docs]
+    if not len(index):
+        return []
+    return index.search(_emb.embed_query(cue), k)
+
+# Hit/miss counters for the embedding cache.
+def cache_stats() -> dict:
+    """Embedding-cache hit rate since process start"""
+    if _emb_cache is None:
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0, "size": 0}
+    return _emb_cache.stats()
+
+# Scrape-time lines for /metrics.
+def _metric_lines() -> list[str]:
+    stats = cache_stats()
+    return [
+        "# TYPE embedding_cache_lookups_total counter",
+        f'embedding_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+        f'embedding_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+        "# TYPE embedding_cache_entries gauge",
+        f"embedding_cache_entries {stats['size']}",
+    ]
 
-    docs = _load_vs(agent).similarity_search(cue, k)
-    return [d.page_content for d in docs]
+register_collector(_metric_lines)
@@ -0,0 +1,179 @@
+# metrics.py
+"""
+In-process latency and usage metrics in Prometheus text format
+
+* `http_request_duration_seconds` – every Flask request, per route template
+* `llm_request_duration_seconds`  – every `gen_oai` call, per model, outcome
+                                    and whether it was a retry
+* `llm_tokens_total`              – prompt / completion tokens per model
+* `db_operation_duration_seconds` – `user_db` operations (see `timed`; the
+                                    functions call `mark_failed` when they
+                                    catch an error)
+
+`init_app(app)` installs the request hooks and serves everything on
+`GET /metrics`. Modules with their own counters (e.g. the embedding cache)
+can add lines at scrape time with `register_collector`.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# Renders one sample line, labels sorted by declaration order.
+def _line(name: str, labelnames: tuple, values: tuple, value: float, extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    labels = "{" + ",".join(pairs) + "}" if pairs else ""
+    return f"{name}{labels} {value:g}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [_line(self.name, self.labelnames, key, value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = []
+        for key, series in items:
+            running = 0
+            for bound, n in zip(self.buckets, series):
+                running += n
+                out.append(_line(f"{self.name}_bucket", self.labelnames, key, running, f'le="{bound:g}"'))
+            out.append(_line(f"{self.name}_bucket", self.labelnames, key, series[-1], 'le="+Inf"'))
+            out.append(_line(f"{self.name}_sum", self.labelnames, key, series[-2]))
+            out.append(_line(f"{self.name}_count", self.labelnames, key, series[-1]))
+        return out
+
+
+REGISTRY: list = []
+_collectors: list = []
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Flask request latency",
+                         ("method", "route", "status"))
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "Chat completion latency",
+                        ("model", "status", "retry"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens sent to / received from the LLM", ("model", "kind"))
+DB_LATENCY = Histogram("db_operation_duration_seconds", "SQLite operation latency", ("op", "status"))
+
+
+# Adds a callable returning extra exposition lines at scrape time.
+def register_collector(fn) -> None:
+    _collectors.append(fn)
+
+# Renders every metric in Prometheus text exposition format.
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for fn in _collectors:
+        lines.extend(fn())
+    return "\n".join(lines) + "\n"
+
+_calls = threading.local()  # per thread: failed flags of the `timed` calls in progress, innermost last
+
+# Marks the innermost `timed` call on this thread as failed, for functions that catch their own errors.
+def mark_failed() -> None:
+    stack = getattr(_calls, "stack", None)
+    if stack:
+        stack[-1] = True
+
+# Decorator: records the wrapped call's duration in *histogram* (status error if it raised or called mark_failed).
+def timed(histogram: Histogram, **labels):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            stack = _calls.__dict__.setdefault("stack", [])
+            stack.append(False)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = fn(*args, **kwargs)
+                status = "error" if stack[-1] else "ok"
+                return result
+            finally:
+                stack.pop()
+                histogram.observe(time.perf_counter() - start, status=status, **labels)
+        return inner
+    return wrap
+
+
+def _start_timer() -> None:
+    g._metrics_start = time.perf_counter()
+
+# after_request hook: time to build the response (streamed bodies finish later).
+def _record_request(resp: Response) -> Response:
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        HTTP_LATENCY.observe(time.perf_counter() - start,
+                             method=request.method, route=route, status=resp.status_code)
+    return resp
+
+def init_app(app) -> None:
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics",
+                     lambda: Response(render(), mimetype="text/plain; version=0.0.4"))
@@ -0,0 +1,143 @@
+# rate_limit.py
+"""
+In-process token-bucket rate limiting for the Flask API
+
+* `RateLimiter` keeps one bucket per key as a `[tokens, updated_at]` pair.
+  Buckets refill continuously. A bucket that has refilled completely holds
+  no information, so a periodic sweep drops it, and idle users and closed
+  rooms cost nothing.
+* `limited(*rules, free_if=None)` guards a Flask route; `check()` is the
+  same test for the ASGI routes. Each rule is `(limiter, scope)` with scope
+  `"room"` (session_id) or `"user"`: google_session_id, else the session_id
+  plus the agent_name/display_name the game and chat clients send. A request
+  with no user id skips its user rules rather than sharing one bucket per
+  client address (a whole NAT would share it). All rules must pass. Tokens
+  taken before a rejecting rule are refunded.
+* `free_if(data)` marks requests that cost nothing, such as a story that is
+  already memoized; they are not charged.
+* Chat traffic and LLM-backed routes draw on separate budgets. The LLM
+  budgets are shared across every LLM route, so alternating endpoints does
+  not multiply anyone's quota.
+
+Rejected requests get `429` with a `Retry-After` header and `retry_after`
+in the body. Set `RATE_LIMITS = "off"` to disable (e.g. for load tests).
+"""
+
+import functools
+import math
+import time
+from threading import Lock
+
+from flask import jsonify, request
+
+from config import setting
+from metrics import Counter
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by the rate limiter", ("route", "scope"))
+
+
+class RateLimiter:
+    def __init__(self, per_minute: float, burst: float | None = None, per_route: bool = False,
+                 sweep_every: int = 1024):
+        self.rate = per_minute / 60
+        self.capacity = float(burst or per_minute)
+        self.per_route = per_route  # separate buckets per route, or one budget across routes
+        self.sweep_every = sweep_every
+        self._buckets: dict[object, list[float]] = {}
+        self._lock = Lock()
+        self._ops = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key, cost: float = 1.0, now: float | None = None) -> float:
+        """Take *cost* tokens for *key*; returns 0 on success, else seconds until they are available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._ops += 1
+            if self._ops % self.sweep_every == 0:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            tokens = self.capacity if bucket is None else min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens < cost:
+                return (cost - tokens) / self.rate
+            self._buckets[key] = [tokens - cost, now]
+            return 0.0
+
+    def refund(self, key, cost: float = 1.0) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + cost)
+
+    # Drops buckets that have refilled to capacity (indistinguishable from new ones).
+    def _sweep(self, now: float) -> None:
+        full = [k for k, (tokens, at) in self._buckets.items() if tokens + (now - at) * self.rate >= self.capacity]
+        for k in full:
+            del self._buckets[k]
+
+
+# chat traffic, per route
+MESSAGES_PER_USER = RateLimiter(per_minute=40, burst=10, per_route=True)
+MESSAGES_PER_ROOM = RateLimiter(per_minute=400, burst=60, per_route=True)
+# LLM-backed routes, one budget across all of them
+LLM_PER_USER = RateLimiter(per_minute=6, burst=3)
+LLM_PER_ROOM = RateLimiter(per_minute=20, burst=5)
+
+
+def _enabled() -> bool:
+    return str(setting("RATE_LIMITS", "on")).lower() not in ("off", "0", "false")
+
+# Identifies the caller for a scope from the JSON body; None when it carries no user id.
+def _scope_id(scope: str, data: dict):
+    if scope == "room":
+        return data.get("session_id") or "-"
+    if data.get("google_session_id"):
+        return data["google_session_id"]
+    name = data.get("agent_name") or data.get("display_name")
+    return (data.get("session_id"), name) if data.get("session_id") and name else None
+
+def check(rules, route: str, data: dict) -> float:
+    """Applies every (limiter, scope) rule; returns 0 if the request may run, else seconds to wait"""
+    if not _enabled():
+        return 0.0
+    taken = []
+    for limiter, scope in rules:
+        caller = _scope_id(scope, data)
+        if caller is None:
+            continue
+        ident = (scope, caller)
+        key = (route, ident) if limiter.per_route else ident
+        wait = limiter.acquire(key)
+        if wait:
+            for prev_limiter, prev_key in taken:
+                prev_limiter.refund(prev_key)
+            RATE_LIMITED.inc(route=route, scope=scope)
+            return wait
+        taken.append((limiter, key))
+    return 0.0
+
+# Body and headers of a 429 for *wait* seconds.
+def rejection(wait: float) -> tuple[dict, dict]:
+    return {"error": "rate limited", "retry_after": round(wait, 2)}, {"Retry-After": str(math.ceil(wait))}
+
+# Route decorator enforcing every (limiter, scope) rule, except on requests *free_if(data)* accepts.
+def limited(*rules, free_if=None):
+    def wrap(fn):
+        fn.rate_limits = rules  # both read by the ASGI routes that mirror this view
+        fn.rate_limit_free_if = free_if
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled():
+                return fn(*args, **kwargs)
+            data = request.get_json(silent=True) or {}
+            if free_if and free_if(data):
+                return fn(*args, **kwargs)
+            wait = check(rules, request.url_rule.rule, data)
+            if wait:
+                body, headers = rejection(wait)
+                return jsonify(body), 429, headers
+            return fn(*args, **kwargs)
+        return inner
+    return wrap
@@ -0,0 +1,41 @@
+# registry.py
+"""
+Lookup indexes for scenarios and game masters
+
+* Built-in scenarios and GMs are indexed by id once at import, and their
+  `/scenarios` and `/gms` listings are pre-encoded together with an ETag.
+* Custom scenarios are not registered here: the Room that uses one holds it
+  (instead of it being appended to the global list), so it goes away with
+  the session.
+"""
+
+import hashlib
+import json
+
+from scenarios import scenarios
+from gm_profiles import gm_list
+
+SCENARIOS_BY_ID: dict[str, dict] = {s["id"]: s for s in scenarios}
+GMS_BY_ID: dict[str, dict] = {g["id"]: g for g in gm_list}
+
+
+class CachedJSON:
+    """A JSON payload encoded once, with a strong ETag derived from its bytes"""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+SCENARIO_LISTING = CachedJSON([{k: s[k] for k in ("id", "title")} for s in scenarios])
+GM_LISTING = CachedJSON([{k: g[k] for k in ("id", "name")} for g in gm_list])
+
+
+# Returns a built-in scenario by id, or None.
+def get_scenario(scenario_id: str) -> dict | None:
+    return SCENARIOS_BY_ID.get(scenario_id)
+
+# Returns a game master by id, or None.
+def get_gm(gm_id: str) -> dict | None:
+    return GMS_BY_ID.get(gm_id)
+
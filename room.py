@@ -2,11 +2,15 @@
 from __future__ import annotations
 import random, re
 
-from scenarios        import scenarios
-from llm_utils        import run_script
+from config           import setting
+from logs             import get_logger
+from registry         import get_scenario
+from llm_utils        import run_script, arun_script, submit_script
 from storage          import get_profile
 from memory_manager   import relevant
 
+log = get_logger("room")
+
 
 # Represents an agent in the game with a name, persona, and optional metadata.
 class Agent:
@@ -16,18 +20,46 @@ class Agent:
         self.meta = meta
 
 
+# heading for the outcome section of a finished game's transcript
+OUTCOME_LABELS = {
+    "lifeboat": "Survivors", "bank_heist": "Released",
+    "mars_outpost": "Oxygen Recipients", "submarine_leak": "Dive Team",
+    "expedition_blizzard": "Sheltered", "time_paradox": "Stabilized",
+}
+
+FORMAT_RULE = (
+    "➤ **FORMAT STRICTLY**: each dialogue line must be `Speaker: dialogue` — "
+    "no markdown, bullets, or extra prefixes.\n\n"
+)
+
+# Turn engines (TURN_ENGINE):
+# * single   – one call writes the GM line and every character's line
+# * parallel – the GM narrates first, then every character's line is generated concurrently on
+#              TURN_LINE_MODEL; each line is validated and retried on its own (up to TURN_LINE_RETRIES)
+TURN_ENGINES = ("single", "parallel")
+
+
 class Room:
     PHASE_NAMES = ["Act I", "Act II", "Act III", "Epilogue"] # Gabe, feel free to adapt the structure if you feel it should be better    # Initializes the Room with a scenario ID, a list of agents, and a GM.
-    def __init__(self, scenario_id: str, agents: list[Agent], gm: dict):
+    def __init__(self, scenario_id: str, agents: list[Agent], gm: dict, scenario: dict | None = None,
+                 session_id: str | None = None, turn_engine: str | None = None):
+        self.session_id = session_id  # fair-queueing key for this game's LLM calls
+        self.turn_engine = turn_engine or setting("TURN_ENGINE", "single")
+        if self.turn_engine not in TURN_ENGINES:
+            raise ValueError(f"Unknown turn engine: {self.turn_engine}")
         self.agents = agents
         self.gm = gm
-        self.scenario = next((s for s in scenarios if s["id"] == scenario_id), None)
+        # custom scenarios are handed in directly; built-in ones come from the registry
+        self.scenario = scenario or get_scenario(scenario_id)
         if not self.scenario:
             raise ValueError(f"Scenario with id {scenario_id} not found.")
         self.dialogue_history: list[str] = []
         self.phase = 0
         self.game_over = False
         self.outcome = []
+        self.version = 0  # bumped whenever the state listed by /rooms changes
+        self._dialogue_md = ""  # transcript body, appended to as turns happen
+        self._memo: dict[str, tuple[int, object]] = {}  # artifact name -> (version, value)
         # Builds the prompt for the turn based on the user agent and user instruction.
     def _build_turn_prompt(self, user_agent: Agent, user_instruction: str):
         phase_name = self.PHASE_NAMES[self.phase]
@@ -39,16 +71,16 @@ class Room:
             f"2. {user_agent.name}: responds.\n"
             "3. One line for *each* other agent (order up to you).\n\n"
         )
-        format_rule = (
-            "➤ **FORMAT STRICTLY**: each dialogue line must be `Speaker: dialogue` — "
-            "no markdown, bullets, or extra prefixes.\n\n"
-        )
         direction_rule = (
             "End the turn with **one** consolidation line:\n"
             "GM_DIRECTION: <concise suggestion for where the story should go next>\n"
         )
-        system_prompt = gm_header + f"Current phase: **{phase_name}**.\n" + common_rules + format_rule + direction_rule
+        system_prompt = gm_header + f"Current phase: **{phase_name}**.\n" + common_rules + FORMAT_RULE + direction_rule
+        user_prompt = self._scene(user_agent, user_instruction) + "### Produce the next turn now."
+        return system_prompt, user_prompt
 
+    # Scenario, cast, the player's bio and memories, the dialogue so far and the director's order.
+    def _scene(self, user_agent: Agent, user_instruction: str) -> str:
         bio  = get_profile(user_agent.name) or {}
         bio_lines = [
             f"- Home: {bio.get('home')}" if bio.get("home") else "",
@@ -64,7 +96,7 @@ class Room:
         cast_md = "\n".join(f"- {a.name}: {a.persona}" for a in self.agents)
         history = "\n".join(self.dialogue_history) or "*none yet*"
 
-        user_prompt = (
+        return (
             f"### Scenario\n{self.scenario['title']}\n"
             f"### Setup\n{self.scenario['setup']}\n\n"
             f"### Cast\n{cast_md}\n\n"
@@ -72,30 +104,120 @@ class Room:
             f"### {user_agent.name} memories (top-of-mind)\n{mem_block}\n\n"
             f"### Dialogue so far\n{history}\n\n"
             f"### Director’s order to {user_agent.name}\n{user_instruction}\n\n"
-            "### Produce the next turn now."
         )
+
+    # Parallel engine, step 1: the GM's narration and direction for this turn.
+    def _build_gm_prompt(self, user_agent: Agent, scene: str):
+        system_prompt = (
+            f"### GM persona\n{self.gm['persona']}\n\n"
+            f"Current phase: **{self.PHASE_NAMES[self.phase]}**.\n"
+            f"You speak as **GM** only; {user_agent.name} and the other characters answer separately.\n"
+            "Produce exactly two lines:\n"
+            f"GM: narration for the current phase that {user_agent.name} and the others can react to\n"
+            "GM_DIRECTION: <concise suggestion for where the story should go next>\n\n"
+            + FORMAT_RULE
+        )
+        return system_prompt, scene + "### Produce the GM narration now."
+
+    # Parallel engine, step 2: one character's line, reacting to the GM narration.
+    def _build_line_prompt(self, speaker: Agent, user_agent: Agent, scene: str, gm_line: str):
+        role = ("Follow the director’s order." if speaker is user_agent
+                else "Stay in character and react to the narration and to the situation.")
+        system_prompt = (
+            f"You write the next line for **{speaker.name}** in a role-play scene.\n"
+            f"### {speaker.name} persona\n{speaker.persona}\n\n"
+            f"{role}\n"
+            f"Reply with exactly one line: `{speaker.name}: dialogue` — no markdown, no other speakers.\n"
+        )
+        user_prompt = scene + f"### This turn\n{gm_line}\n\n### Produce {speaker.name}'s line now."
         return system_prompt, user_prompt
 
-    # Summarizes the current dialogue history in 3-4 sentences.
+    # Summarizes the current dialogue history in 3-4 sentences (interactive: /submit_turn waits on it).
     def _summarise(self):
         prompt = "Briefly summarise in 3-4 sentences what is happening right now:\n\n" + "\n".join(self.dialogue_history)
-        return run_script("You are a concise narrator.", prompt, temperature=0.3, max_tokens=150)
+        return run_script("You are a concise narrator.", prompt, temperature=0.3, max_tokens=150, room=self.session_id)
 
     # Turns the dialogue history into a coherent short story.
-    def full_story(self):
+    def _story_call(self) -> tuple[tuple, dict]:
         prompt = "Turn the following dialogue into a coherent short story:\n\n" + "\n".join(self.dialogue_history)
-        return run_script("You are a creative writer.", prompt, temperature=0.7, max_tokens=1000)    # Processes a turn by generating a response based on the user agent's instruction and updates the dialogue history.
+        return ("You are a creative writer.", prompt), dict(temperature=0.7, max_tokens=1000, priority="background",
+                                                            room=self.session_id, coalesce=True)
+
+    def full_story(self):
+        args, kwargs = self._story_call()
+        return run_script(*args, **kwargs)
+
+    # Returns *build()*, computed once per room version.
+    def _memoized(self, name: str, build):
+        hit = self._memo.get(name)
+        if hit and hit[0] == self.version:
+            return hit[1]
+        version = self.version
+        value = build()
+        self._memo[name] = (version, value)
+        return value
+
+    # Async form of _memoized: *build* is a coroutine function.
+    async def _amemoized(self, name: str, build):
+        hit = self._memo.get(name)
+        if hit and hit[0] == self.version:
+            return hit[1]
+        version = self.version
+        value = await build()
+        self._memo[name] = (version, value)
+        return value
+
+    # True when story() would be answered from the memo, without an LLM call.
+    def story_cached(self) -> bool:
+        hit = self._memo.get("story")
+        return bool(hit and hit[0] == self.version)
+
+    # The story for the dialogue so far; generated once per version (a finished game never changes).
+    def story(self) -> str:
+        return self._memoized("story", self.full_story)
+
+    # story() for the ASGI server: awaits the generation without holding a thread.
+    async def astory(self) -> str:
+        args, kwargs = self._story_call()
+        return await self._amemoized("story", lambda: arun_script(*args, **kwargs))
+
+    # Yields the markdown transcript: fixed header, the incrementally built dialogue, then the outcome.
+    def iter_markdown(self):
+        difficulty = f" ({self.gm['difficulty']})" if self.gm.get("difficulty") else ""
+        yield (
+            f"# {self.scenario['title']}\n\n"
+            f"## GM: {self.gm['name']}{difficulty}\n\n"
+            f"## Setup\n{self.scenario['setup']}\n\n"
+            "## Dialogue\n"
+        )
+        yield self._dialogue_md
+        if self.game_over and self.outcome:
+            label = OUTCOME_LABELS.get(self.scenario.get("id"), "Outcome")
+            yield f"\n\n## {label}\n{', '.join(self.outcome)}"
+
+    # Listing / lookup view of the session.
+    def info(self) -> dict:
+        info = {
+            "session_id": self.session_id,
+            "scenario_title": self.scenario["title"],
+            "gm_name": self.gm["name"],
+            "phase": self.phase,
+            "agents": [{"name": a.name, "persona": a.persona} for a in self.agents],
+            "game_over": self.game_over,
+        }
+        if self.game_over:
+            info["outcome"] = self.outcome
+        return info
+    # Processes a turn by generating a response based on the user agent's instruction and updates the dialogue history.
     def process_turn(self, user_agent_name: str, user_instruction: str):
         user_agent = next(a for a in self.agents if a.name == user_agent_name)
-        sys_p, usr_p = self._build_turn_prompt(user_agent, user_instruction)
-        raw = run_script(sys_p, usr_p, temperature=0.7).strip()
-        if not re.search(rf"^{re.escape(user_agent.name)}:", raw, re.I | re.M):
-            raw = run_script(
-                sys_p,
-                usr_p + f"\n(Previous reply lacked a line for {user_agent.name}.)",
-                temperature=0.7,
-            ).strip()
+        if self.turn_engine == "parallel":
+            raw = self._parallel_turn(user_agent, user_instruction)
+        else:
+            raw = self._single_turn(user_agent, user_instruction)
         self.dialogue_history.append(raw)
+        self._dialogue_md += ("\n\n" if self._dialogue_md else "") + raw
+        self.version += 1
         if self.phase < 3:
             self.phase += 1
         else:
@@ -112,3 +234,90 @@ class Room:
             "summary": summary,
             "game_over": self.game_over
         }
+
+    # Single engine: the whole turn in one call (retried once if the player's line is missing).
+    def _single_turn(self, user_agent: Agent, user_instruction: str) -> str:
+        sys_p, usr_p = self._build_turn_prompt(user_agent, user_instruction)
+        raw = run_script(sys_p, usr_p, temperature=0.7, room=self.session_id).strip()
+        if not re.search(rf"^{re.escape(user_agent.name)}:", raw, re.I | re.M):
+            raw = run_script(
+                sys_p,
+                usr_p + f"\n(Previous reply lacked a line for {user_agent.name}.)",
+                temperature=0.7,
+                retry=True,
+                room=self.session_id,
+            ).strip()
+        return raw
+
+    # Parallel engine: GM narration, then every character's line at once; assembled in cast order.
+    def _parallel_turn(self, user_agent: Agent, user_instruction: str) -> str:
+        scene = self._scene(user_agent, user_instruction)
+        sys_p, usr_p = self._build_gm_prompt(user_agent, scene)
+        gm_text = run_script(sys_p, usr_p, temperature=0.7, max_tokens=300, room=self.session_id)
+        gm_line, direction = _speaker_line(gm_text, "GM"), _speaker_line(gm_text, "GM_DIRECTION")
+        if not gm_line:
+            gm_text = run_script(sys_p, usr_p + "\n(Previous reply lacked the `GM:` line.)", temperature=0.7,
+                                 max_tokens=300, retry=True, room=self.session_id)
+            gm_line, direction = _speaker_line(gm_text, "GM"), _speaker_line(gm_text, "GM_DIRECTION")
+        gm_line = gm_line or _coerce_line(gm_text, "GM")
+
+        speakers = [user_agent] + [a for a in self.agents if a is not user_agent]
+        lines = self._character_lines(speakers, user_agent, scene, gm_line)
+        turn = [gm_line] + [lines[a.name] for a in speakers if a.name in lines]
+        return "\n".join(turn + ([direction] if direction else []))
+
+    # Generates one line per speaker concurrently; invalid lines (and failed calls) are retried on their own.
+    def _character_lines(self, speakers: list[Agent], user_agent: Agent, scene: str, gm_line: str) -> dict:
+        model = setting("TURN_LINE_MODEL", "gpt-4o-mini")
+        retries = int(setting("TURN_LINE_RETRIES", 2))
+        prompts = {a.name: self._build_line_prompt(a, user_agent, scene, gm_line) for a in speakers}
+
+        def submit(name: str, note: str = ""):
+            sys_p, usr_p = prompts[name]
+            return submit_script(sys_p, usr_p + note, model=model, temperature=0.8, max_tokens=120,
+                                 retry=bool(note), room=self.session_id)
+
+        lines, texts, errors = {}, {}, {}
+        pending = {name: submit(name) for name in prompts}
+        for attempt in range(retries + 1):
+            for name, future in pending.items():
+                try:
+                    texts[name] = future.result().text
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                line = _speaker_line(texts[name], name)
+                if line:
+                    lines[name] = line
+            failed = [name for name in pending if name not in lines]
+            if not failed or attempt == retries:
+                break
+            pending = {name: submit(name, f"\n(Previous reply was not a single `{name}: dialogue` line.)")
+                       for name in failed}
+
+        for name in prompts:
+            if name in lines:
+                continue
+            if texts.get(name, "").strip():
+                lines[name] = _coerce_line(texts[name], name)  # keep the content, fix the speaker tag
+            elif name == user_agent.name:
+                raise errors.get(name) or RuntimeError(f"No line generated for {name}")
+            else:
+                log.warning("dropping %s's line after %d attempts", name, retries + 1)
+        return lines
+
+
+# First `name: dialogue` line in *text*, normalised, or None.
+def _speaker_line(text: str, name: str) -> str | None:
+    for line in text.splitlines():
+        line = line.replace("**", "").strip()
+        match = re.match(rf"{re.escape(name)}\s*:\s*(\S.*)", line, re.I)
+        if match:
+            return f"{name}: {match.group(1).strip()}"
+    return None
+
+# First non-empty line of *text* as `name: ...` (any other speaker tag replaced).
+def _coerce_line(text: str, name: str) -> str:
+    first = next((l.strip() for l in text.splitlines() if l.strip()), "...")
+    dialogue = re.sub(r"^[^:]{1,40}:\s*", "", first)
+    return f"{name}: {dialogue}"
@@ -0,0 +1,121 @@
+# room_index.py
+"""
+Discovery index for active icebreaker rooms
+
+Rooms are numbered in creation order and kept in buckets keyed by
+(has_space, activity_type). Each bucket is a sorted list of those numbers.
+The index listens to room changes and only moves a room between buckets
+when its bucket key changes.
+
+`page()` walks the matching buckets newest-first from a cursor and merges
+them, so a listing costs about the page size, not the number of rooms.
+A title-prefix filter is applied while walking, so a selective prefix
+reads more rows than it returns.
+"""
+
+import heapq
+import itertools
+from bisect import bisect_left, insort
+from threading import RLock
+
+
+class RoomIndex:
+    def __init__(self):
+        self._seq = itertools.count(1)
+        self._lock = RLock()
+        self._entries: dict[str, dict] = {}          # session_id -> entry
+        self._by_seq: dict[int, dict] = {}           # creation number -> entry
+        self._buckets: dict[tuple[bool, str], list[int]] = {}
+        self.version = 0                             # bumped when any listing changes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, room) -> None:
+        """Start indexing *room* and follow its changes"""
+        with self._lock:
+            entry = {"seq": next(self._seq), "room": room, "key": None, "sig": None, "info": None}
+            self._entries[room.session_id] = entry
+            self._by_seq[entry["seq"]] = entry
+            self._refresh(entry)
+        room.add_listener(self.update)
+
+    def update(self, room) -> None:
+        """Room listener: re-bucket the room if its listing fields changed"""
+        with self._lock:
+            entry = self._entries.get(room.session_id)
+            if entry is not None:
+                self._refresh(entry)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return
+            self._unbucket(entry)
+            del self._by_seq[entry["seq"]]
+            self.version += 1
+
+    # Recomputes an entry's listing row and bucket (caller holds the lock).
+    def _refresh(self, entry: dict) -> None:
+        room = entry["room"]
+        count = len(room.participants)
+        sig = (room.room_title, count, room.max_participants, room.activity_type, room.is_active)
+        if sig == entry["sig"]:
+            return
+        entry["sig"] = sig
+        entry["info"] = {
+            "session_id": room.session_id,
+            "room_title": room.room_title,
+            "participant_count": count,
+            "max_participants": room.max_participants,
+            "activity_type": room.activity_type,
+            "created_at": room.created_at.isoformat(),
+            "has_space": count < room.max_participants,
+        }
+        key = (count < room.max_participants, room.activity_type) if room.is_active else None
+        if key != entry["key"]:
+            self._unbucket(entry)
+            if key is not None:
+                insort(self._buckets.setdefault(key, []), entry["seq"])
+            entry["key"] = key
+        self.version += 1
+
+    def _unbucket(self, entry: dict) -> None:
+        if entry["key"] is None:
+            return
+        bucket = self._buckets[entry["key"]]
+        del bucket[bisect_left(bucket, entry["seq"])]
+        if not bucket:
+            del self._buckets[entry["key"]]
+        entry["key"] = None
+
+    def page(self, limit: int | None = 50, cursor: int | None = None, has_space: bool | None = None,
+             activity_type: str | None = None, title_prefix: str | None = None) -> tuple[list[dict], int | None]:
+        """
+        Return up to *limit* active rooms (all of them if None), newest first, created
+        before *cursor*, plus the cursor for the next page (None when there is none).
+        """
+        prefix = title_prefix.lower() if title_prefix else None
+        with self._lock:
+            buckets = [
+                b for (space, kind), b in self._buckets.items()
+                if (has_space is None or space == has_space)
+                and (activity_type is None or kind == activity_type)
+            ]
+
+            # newest-first iterator over each bucket, starting just below the cursor
+            def descending(bucket):
+                start = bisect_left(bucket, cursor) if cursor is not None else len(bucket)
+                return (-bucket[i] for i in range(start - 1, -1, -1))
+
+            rows, last = [], None
+            for neg_seq in heapq.merge(*(descending(b) for b in buckets)):
+                if limit is not None and len(rows) == limit:
+                    return rows, last
+                entry = self._by_seq[-neg_seq]
+                if prefix and not entry["info"]["room_title"].lower().startswith(prefix):
+                    continue
+                rows.append(entry["info"])
+                last = entry["seq"]
+            return rows, None
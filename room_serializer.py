@@ -0,0 +1,55 @@
+# room_serializer.py
+"""
+Fast JSON encoding for icebreaker room state
+
+`get_room_state()` used to rebuild a dict per participant and message on
+every 2-second poll and run the whole thing through the stdlib encoder.
+Here participants and messages are encoded once and their bytes reused
+(see `Participant.to_json` and `IcebreakerRoom.chat_json`). Only the small
+header is encoded per call, and `iter_room_state` streams `chat_history`
+in chunks instead of building one large string.
+
+orjson is used when installed, otherwise the stdlib encoder.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHAT_CHUNK = 64  # messages per streamed chunk
+
+
+# Encodes a JSON-serialisable object to compact UTF-8 bytes.
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Yields the JSON for room.get_room_state() in pieces, reusing cached fragments.
+def iter_room_state(room):
+    header = dumps(room.get_room_state(include_lists=False))
+    participants = b",".join(p.to_json() for p in room.participants)
+    yield header[:-1] + b',"participants":[' + participants + b'],"chat_history":['
+
+    messages = room.chat_json()
+    n = len(messages)  # later appends belong to the next poll
+    for start in range(0, n, CHAT_CHUNK):
+        chunk = b",".join(messages[start:start + CHAT_CHUNK])
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]}"
+
+
+# Encodes the full room state to bytes.
+def room_state_bytes(room) -> bytes:
+    return b"".join(iter_room_state(room))
+
+
+# Encodes *payload* with the room state embedded under "room_state".
+def dumps_with_state(payload: dict, room) -> bytes:
+    head = dumps(payload)
+    sep = b"," if len(head) > 2 else b""
+    return head[:-1] + sep + b'"room_state":' + room_state_bytes(room) + b"}"
@@ -0,0 +1,87 @@
+# scheduler.py
+"""
+Heap-based deadline scheduler for room timers
+
+Rooms register a callback for each deadline (ready timer, votekick expiry)
+instead of checking datetimes whenever somebody polls. One daemon thread
+sleeps until the earliest deadline and hands due callbacks to a small worker
+pool, so a slow callback (an LLM call) never delays the other timers.
+
+Each deadline has a key. Scheduling a key again replaces its old deadline,
+and a cancelled or replaced deadline never fires.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import get_logger
+
+log = get_logger("scheduler")
+
+
+class DeadlineScheduler:
+    def __init__(self, workers: int = 4):
+        self._heap: list[tuple[float, int, object]] = []
+        self._live: dict[object, tuple[int, callable]] = {}   # key -> (seq, callback)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = workers
+        self._pool = None
+        self._thread = None
+
+    def schedule(self, key, delay: float, callback) -> None:
+        """Run *callback()* once, *delay* seconds from now, replacing any deadline for *key*"""
+        with self._cond:
+            self._start()
+            seq = next(self._seq)
+            self._live[key] = (seq, callback)
+            heapq.heappush(self._heap, (time.monotonic() + delay, seq, key))
+            self._cond.notify()
+
+    def cancel(self, key) -> bool:
+        """Drop the pending deadline for *key*; returns False if there was none"""
+        with self._cond:
+            return self._live.pop(key, None) is not None
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._live)
+
+    # Starts the timer thread and worker pool on first use (caller holds the condition).
+    def _start(self) -> None:
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix="deadline")
+            self._thread = threading.Thread(target=self._run, name="deadline-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    # discard heap entries whose key was cancelled or rescheduled
+                    while self._heap and self._live.get(self._heap[0][2], (None,))[0] != self._heap[0][1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due = self._heap[0][0] - time.monotonic()
+                    if due <= 0:
+                        break
+                    self._cond.wait(due)
+                _, _, key = heapq.heappop(self._heap)
+                _, callback = self._live.pop(key)
+            self._pool.submit(self._fire, callback)
+
+    @staticmethod
+    def _fire(callback) -> None:
+        try:
+            callback()
+        except Exception:
+            log.exception("deadline callback failed")
+
+
+# Shared scheduler used by all rooms in this process.
+scheduler = DeadlineScheduler()
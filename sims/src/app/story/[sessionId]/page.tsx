@@ -27,18 +27,16 @@ export default function StoryPage() {
       try {
         setLoading(true);
         
-        // First get the room info
-        const roomsResponse = await fetch(`http://${SERVER_ADDRESS}/rooms`);
-        if (!roomsResponse.ok) {
+        // First get this session's info
+        const sessionResponse = await fetch(`http://${SERVER_ADDRESS}/session/${encodeURIComponent(sessionId)}`);
+        if (sessionResponse.status === 404) {
+          throw new Error('Game session not found');
+        }
+        if (!sessionResponse.ok) {
           throw new Error('Failed to fetch game data');
         }
         
-        const rooms = await roomsResponse.json();
-        const currentRoom = rooms.find((room: any) => room.session_id === sessionId);
-        
-        if (!currentRoom) {
-          throw new Error('Game session not found');
-        }
+        const currentRoom = await sessionResponse.json();
         
         setGameInfo({
           title: currentRoom.scenario_title,
@@ -0,0 +1,73 @@
+# singleflight.py
+"""
+Request coalescing for expensive calls
+
+`SingleFlight.do(key, fn)` runs *fn* once per key at a time. Callers that
+arrive while a call with the same key is in flight wait for it and get the
+same result (or exception) instead of starting their own. Nothing is cached
+after the call finishes, so later callers trigger a fresh call.
+
+`SingleFlight.future(key, start)` is the non-blocking form for work that
+already returns a Future (e.g. a scheduled LLM call): the first caller's
+`start()` future is handed to everyone until it resolves, so async
+handlers can await it without holding a thread.
+
+Used in front of LLM calls: several clients asking for the same story, or
+two paths racing to post a room's next icebreaker, cost one generation.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from metrics import Counter
+
+COALESCED = Counter("singleflight_calls_total", "Calls through single-flight groups, by role",
+                    ("group", "role"))
+
+
+class SingleFlight:
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: dict[object, Future] = {}
+
+    def do(self, key, fn):
+        """Run *fn* (or join the in-flight call for *key*); returns (result, shared)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        COALESCED.inc(group=self.name, role="leader" if leader else "shared")
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result(), False
+
+    def future(self, key, start) -> Future:
+        """Future from *start()*, or the one already in flight for *key*"""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = start()
+        COALESCED.inc(group=self.name, role="leader" if leader else "shared")
+        if leader:
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
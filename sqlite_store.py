@@ -0,0 +1,150 @@
+# sqlite_store.py
+"""
+Indexed SQLite storage for agent memories and profiles
+
+Replaces the TinyDB JSON files, which were rewritten in full on every insert
+and scanned row by row on every lookup:
+
+* `MemoryStore`  – `memories.db`, rows indexed by (agent, id)
+* `ProfileStore` – `agents.db`, profiles keyed by name
+
+Both stores import their legacy TinyDB file (`memories.json` / `agents.json`)
+the first time they are created. To run the import by hand:
+
+    python sqlite_store.py
+"""
+
+import json
+import os
+import sqlite3
+from threading import Lock
+
+
+# Opens a connection shared across request threads (callers serialise access with a lock).
+def connect(path: str) -> sqlite3.Connection:
+    """Connection with WAL journaling, matching user_db’s settings"""
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=memory")
+    return conn
+
+
+# Yields (doc_id, document) pairs from a TinyDB JSON file's default table.
+def _tinydb_rows(json_path: str):
+    if not os.path.exists(json_path):
+        return
+    with open(json_path, encoding="utf-8") as f:
+        raw = f.read().strip()
+    if not raw:
+        return
+    table = json.loads(raw).get("_default", {})
+    for doc_id, doc in sorted(table.items(), key=lambda kv: int(kv[0])):
+        yield int(doc_id), doc
+
+
+class MemoryStore:
+    def __init__(self, path: str = "memories.db", legacy_json: str | None = "memories.json"):
+        self._lock = Lock()
+        self._conn = connect(path)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS memories ("
+                " id INTEGER PRIMARY KEY, agent TEXT NOT NULL, text TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_agent ON memories (agent, id)")
+            self._conn.commit()
+        if legacy_json and self.count() == 0:
+            self.import_json(legacy_json)
+
+    def import_json(self, json_path: str) -> int:
+        """Copy rows from a TinyDB memories file; re-running it is a no-op"""
+        rows = [(doc_id, d["agent"], d["text"]) for doc_id, d in _tinydb_rows(json_path)]
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO memories (id, agent, text) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def insert(self, agent: str, text: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT INTO memories (agent, text) VALUES (?, ?)", (agent, text))
+            self._conn.commit()
+
+    def texts(self, agent: str) -> list[str]:
+        """All memories of *agent*, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM memories WHERE agent = ? ORDER BY id", (agent,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self, agent: str | None = None) -> int:
+        with self._lock:
+            if agent is None:
+                return self._conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM memories WHERE agent = ?", (agent,)
+            ).fetchone()[0]
+
+
+class ProfileStore:
+    def __init__(self, path: str = "agents.db", legacy_json: str | None = "agents.json"):
+        self._lock = Lock()
+        self._conn = connect(path)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        if legacy_json and not self.names():
+            self.import_json(legacy_json)
+
+    def import_json(self, json_path: str) -> int:
+        """Copy profiles from a TinyDB agents file, merging into existing rows"""
+        n = 0
+        for _, doc in _tinydb_rows(json_path):
+            if doc.get("name"):
+                self.upsert(doc)
+                n += 1
+        return n
+
+    def upsert(self, profile: dict) -> None:
+        """Insert, or merge the given fields into the stored profile (TinyDB upsert semantics)"""
+        with self._lock:
+            # shallow merge in Python, like TinyDB's update and storage.py's cache: top-level keys
+            # are replaced whole (nested dicts are not merged, None is stored as null)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM profiles WHERE name = ?", (profile["name"],)).fetchone()
+                merged = {**json.loads(row[0]), **profile} if row else profile
+                self._conn.execute(
+                    "INSERT INTO profiles (name, data) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                    (profile["name"], json.dumps(merged)),
+                )
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def get(self, name: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def names(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM profiles ORDER BY name").fetchall()
+        return [r[0] for r in rows]
+
+    def all(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM profiles ORDER BY name").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+if __name__ == "__main__":
+    print(f"memories: {MemoryStore(legacy_json=None).import_json('memories.json')} imported")
+    print(f"profiles: {ProfileStore(legacy_json=None).import_json('agents.json')} imported")
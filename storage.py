@@ -1,20 +1,65 @@
 # storage.py
-from tinydb import TinyDB, Query
+"""
+Profile storage with a read-through cache
 
+Profiles live in SQLite (`agents.db`). They are read once into `_cache`
+and every `upsert_profile` writes through to both, so `get_profile` (called
+on every Room turn) and `list_profiles` never touch the database.
+"""
+from bisect import insort
+from threading import Lock
 
-db = TinyDB("agents.json")
-Q = Query()
+from sqlite_store import ProfileStore
+
+
+_lock = Lock()
+_db: ProfileStore | None = None
+_cache: dict[str, dict] | None = None   # name -> profile, loaded on first read
+_names: list[str] = []                  # sorted index of the cache keys
+_version = 0                            # bumped on every upsert, for ETags
+
+# Opens the database on first use (caller holds `_lock`).
+def _store() -> ProfileStore:
+    global _db
+    if _db is None:
+        _db = ProfileStore("agents.db")
+    return _db
+
+# Fills the cache from the database on first use.
+def _loaded() -> dict[str, dict]:
+    global _cache, _names
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                profiles = _store().all()
+                _names = [p["name"] for p in profiles]
+                _cache = {p["name"]: p for p in profiles}
+    return _cache
 
 # Insert a new profile or update an existing profile in the database based on the profile's name.
 def upsert_profile(profile: dict):
-    db.upsert(profile, Q.name == profile["name"])
+    global _version
+    cache = _loaded()
+    with _lock:
+        _store().upsert(profile)
+        _version += 1
+        name = profile["name"]
+        if name in cache:
+            cache[name] = {**cache[name], **profile}
+        else:
+            cache[name] = dict(profile)
+            insort(_names, name)
 
-# Retrieve a profile from the database by name. Returns the profile dictionary if found, otherwise returns None.
+# Retrieve a profile by name. Returns a copy of the profile dictionary if found, otherwise returns None.
 def get_profile(name: str) -> dict | None:
-    res = db.search(Q.name == name)
-    return res[0] if res else None
+    p = _loaded().get(name)
+    return dict(p) if p is not None else None
 
-# Return a sorted list of all stored profile names from the database.
+# Return a sorted list of all stored profile names.
 def list_profiles() -> list[str]:
-    return sorted(r["name"] for r in db.all())
+    _loaded()
+    return list(_names)
 
+# Return a counter that changes whenever any profile changes.
+def profiles_version() -> int:
+    return _version
@@ -0,0 +1,124 @@
+# transcripts.py
+"""
+Streaming transcript export for both room types
+
+`export(room, fmt)` returns `(chunks, mimetype, extension)`. *chunks* is a
+generator of byte strings, each around `CHUNK_SIZE`. It walks the room's
+history by index and never joins it, so memory stays flat however long the
+session is. Formats:
+
+* `md`    – Markdown (legacy games reuse `Room.iter_markdown`)
+* `jsonl` – one JSON object per line: a session header, then one line per
+            turn / chat message (icebreaker lines reuse the cached encoded
+            messages)
+* `txt`   – plain text, one line per chat message or turn
+"""
+
+from datetime import datetime
+
+from room import Room
+from room_serializer import dumps
+
+CHUNK_SIZE = 16 * 1024
+FORMATS = {
+    "md": ("text/markdown", "md"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "txt": ("text/plain", "txt"),
+}
+
+
+# Groups small byte pieces into chunks of roughly CHUNK_SIZE.
+def _batched(pieces):
+    buf, size = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+def _time(iso: str) -> str:
+    try:
+        return datetime.fromisoformat(iso).strftime("%H:%M")
+    except (TypeError, ValueError):
+        return ""
+
+
+# --- legacy game rooms ---
+
+def _game_md(room: Room):
+    for piece in room.iter_markdown():
+        # the dialogue body is one string; encode it a chunk at a time, not as a whole-session copy
+        for start in range(0, len(piece), CHUNK_SIZE):
+            yield piece[start:start + CHUNK_SIZE].encode()
+
+def _game_jsonl(room: Room):
+    yield dumps({"type": "session", **room.info(), "setup": room.scenario["setup"]}) + b"\n"
+    history = room.dialogue_history
+    for i in range(len(history)):
+        yield dumps({"type": "turn", "index": i, "phase": Room.PHASE_NAMES[min(i, 3)], "text": history[i]}) + b"\n"
+    if room.game_over:
+        yield dumps({"type": "outcome", "names": room.outcome}) + b"\n"
+
+def _game_txt(room: Room):
+    yield f"{room.scenario['title']}\nGM: {room.gm['name']}\n\n{room.scenario['setup']}\n".encode()
+    history = room.dialogue_history
+    for i in range(len(history)):
+        yield f"\n{history[i]}\n".encode()
+    if room.game_over and room.outcome:
+        yield f"\nOutcome: {', '.join(room.outcome)}\n".encode()
+
+
+# --- icebreaker rooms ---
+
+def _chat_header(room) -> dict:
+    return {
+        "session_id": room.session_id,
+        "room_title": room.room_title,
+        "facilitator_name": room.facilitator_name,
+        "created_at": room.created_at.isoformat(),
+        "participants": [p.display_name for p in room.participants],
+    }
+
+def _chat_md(room):
+    head = _chat_header(room)
+    yield f"# {head['room_title']}\n\nFacilitator: {head['facilitator_name']}\n\n## Chat\n".encode()
+    history = room.chat_history
+    for i in range(len(history)):
+        m = history[i]
+        if m["type"] == "user_message":
+            line = f"\n**{m['sender_name']}** ({_time(m['timestamp'])}): {m['content']}\n"
+        elif m["type"] == "icebreaker":
+            line = f"\n> 🧊 {m['content']}\n"
+        else:
+            line = f"\n_{m['content']}_\n"
+        yield line.encode()
+
+def _chat_jsonl(room):
+    yield dumps({"type": "session", **_chat_header(room)}) + b"\n"
+    encoded = room.chat_json()  # cached per-message JSON, append-only
+    for i in range(len(encoded)):
+        yield encoded[i] + b"\n"
+
+def _chat_txt(room):
+    yield f"{room.room_title}\n\n".encode()
+    history = room.chat_history
+    for i in range(len(history)):
+        m = history[i]
+        yield f"[{_time(m['timestamp'])}] {m['sender_name']}: {m['content']}\n".encode()
+
+
+_WRITERS = {
+    (True, "md"): _game_md, (True, "jsonl"): _game_jsonl, (True, "txt"): _game_txt,
+    (False, "md"): _chat_md, (False, "jsonl"): _chat_jsonl, (False, "txt"): _chat_txt,
+}
+
+
+def export(room, fmt: str = "md"):
+    """Returns (byte chunk generator, mimetype, file extension) for *room* in *fmt*"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown transcript format: {fmt}")
+    mimetype, ext = FORMATS[fmt]
+    return _batched(_WRITERS[(isinstance(room, Room), fmt)](room)), mimetype, ext
@@ -5,9 +5,15 @@ import os
 import threading
 import time
 
+from metrics import DB_LATENCY, mark_failed, timed
+from logs import get_logger
+
+log = get_logger("user_db")
+
 DB_PATH = "users.db"
 # Thread lock for database operations
 db_lock = threading.Lock()
+_initialized_path = None  # DB_PATH whose schema init_user_db() has already ensured
 
 def get_db_connection():
     """Get a database connection with proper timeout and WAL mode"""
@@ -18,9 +24,13 @@ def get_db_connection():
     conn.execute('PRAGMA temp_store=memory')
     return conn
 
+@timed(DB_LATENCY, op="init_user_db")
 def init_user_db():
-    """Initialize the user database"""
+    """Initialize the user database (idempotent; only the first call per DB_PATH does work)"""
+    global _initialized_path
     with db_lock:
+        if _initialized_path == DB_PATH:
+            return
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -63,7 +73,9 @@ def init_user_db():
         
         conn.commit()
         conn.close()
+        _initialized_path = DB_PATH
 
+@timed(DB_LATENCY, op="create_or_update_user")
 def create_or_update_user(google_session_id, display_name, profile_picture_url=None):
     """Create or update a user using UPSERT for better concurrency"""
     with db_lock:
@@ -91,11 +103,13 @@ def create_or_update_user(google_session_id, display_name, profile_picture_url=N
             conn.close()
             return True
         except Exception as e:
-            print(f"Error creating/updating user: {e}")
+            log.exception("error creating/updating user")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return False
 
+@timed(DB_LATENCY, op="get_user")
 def get_user(google_session_id):
     """Get user by Google session ID"""
     with db_lock:
@@ -122,11 +136,13 @@ def get_user(google_session_id):
                 }
             return None
         except Exception as e:
-            print(f"Error getting user: {e}")
+            log.exception("error getting user")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return None
 
+@timed(DB_LATENCY, op="update_user_stats")
 def update_user_stats(google_session_id, message_sent=False, room_joined=False):
     """Update user statistics"""
     with db_lock:
@@ -150,11 +166,13 @@ def update_user_stats(google_session_id, message_sent=False, room_joined=False):
             conn.close()
             return True
         except Exception as e:
-            print(f"Error updating user stats: {e}")
+            log.exception("error updating user stats")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return False
 
+@timed(DB_LATENCY, op="set_user_ready_status")
 def set_user_ready_status(room_session_id, google_session_id, is_ready):
     """Set user's ready status for a room"""
     with db_lock:
@@ -178,11 +196,13 @@ def set_user_ready_status(room_session_id, google_session_id, is_ready):
             conn.close()
             return True
         except Exception as e:
-            print(f"Error setting ready status: {e}")
+            log.exception("error setting ready status")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return False
 
+@timed(DB_LATENCY, op="get_room_ready_status")
 def get_room_ready_status(room_session_id):
     """Get ready status for all users in a room"""
     with db_lock:
@@ -200,11 +220,13 @@ def get_room_ready_status(room_session_id):
             
             return {user_id: bool(ready) for user_id, ready in ready_status}
         except Exception as e:
-            print(f"Error getting room ready status: {e}")
+            log.exception("error getting room ready status")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return {}
 
+@timed(DB_LATENCY, op="join_user_to_room")
 def join_user_to_room(google_session_id, room_session_id):
     """Record user joining a room"""
     with db_lock:
@@ -226,11 +248,13 @@ def join_user_to_room(google_session_id, room_session_id):
             conn.close()
             return True
         except Exception as e:
-            print(f"Error joining user to room: {e}")
+            log.exception("error joining user to room")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return False
 
+@timed(DB_LATENCY, op="get_user_stats")
 def get_user_stats(google_session_id):
     """Get comprehensive user statistics"""
     with db_lock:
@@ -262,11 +286,13 @@ def get_user_stats(google_session_id):
                 'total_ready_votes': room_stats[2] if room_stats[2] else 0
             }
         except Exception as e:
-            print(f"Error getting user stats: {e}")
+            log.exception("error getting user stats")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return None
 
+@timed(DB_LATENCY, op="leave_user_from_room")
 def leave_user_from_room(google_session_id, room_session_id=None):
     """Record user leaving a room and clear current room data"""
     with db_lock:
@@ -295,10 +321,8 @@ def leave_user_from_room(google_session_id, room_session_id=None):
             conn.close()
             return True
         except Exception as e:
-            print(f"Error removing user from room: {e}")
+            log.exception("error removing user from room")
+            mark_failed()
             if 'conn' in locals():
                 conn.close()
             return False
-
-# Initialize the database when imported
-init_user_db()
@@ -0,0 +1,62 @@
+# vector_index.py
+"""
+In-process brute-force vector index
+
+Keeps one agent's memories as a contiguous, L2-normalised float32 matrix.
+A lookup is a single matrix-vector product plus `argpartition`, which for a
+few hundred rows is far cheaper than a round-trip through Chroma.
+"""
+
+import numpy as np
+
+
+class VectorIndex:
+    def __init__(self, dim: int | None = None, capacity: int = 64):
+        # the dimension can be left open until the first vector arrives
+        self.dim = dim
+        self._capacity = capacity
+        self._mat = np.empty((capacity, dim or 0), dtype=np.float32)
+        self._texts: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @property
+    def texts(self) -> list[str]:
+        return list(self._texts)
+
+    # Returns rows scaled to unit length (zero rows are left as zeros).
+    @staticmethod
+    def _normalise(vecs) -> np.ndarray:
+        m = np.asarray(vecs, dtype=np.float32).reshape(-1, np.shape(vecs)[-1])
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
+
+    def add(self, texts: list[str], vecs) -> None:
+        """Append texts with their embeddings, growing the matrix geometrically"""
+        if not texts:
+            return
+        rows = self._normalise(vecs)
+        if self.dim is None:
+            self.dim = rows.shape[1]
+            self._mat = np.empty((self._capacity, self.dim), dtype=np.float32)
+        n, need = len(self._texts), len(self._texts) + len(texts)
+        if need > self._mat.shape[0]:
+            grown = np.empty((max(need, 2 * self._mat.shape[0]), self.dim), dtype=np.float32)
+            grown[:n] = self._mat[:n]
+            self._mat = grown
+        self._mat[n:need] = rows
+        self._texts.extend(texts)
+
+    def search(self, query, k: int = 3) -> list[str]:
+        """Return up to *k* texts by descending cosine similarity to *query*"""
+        n = len(self._texts)
+        if n == 0 or k <= 0:
+            return []
+        scores = self._mat[:n] @ self._normalise(query)[0]
+        if k < n:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self._texts[i] for i in top]